@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import math
+import os
+import time
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+from discord.ext.commands.hybrid import HybridAppCommand
+
+from command_sync import sync_commands
+from metrics import EVENTS
+from gateway import cache_footprint, client_options
+from loop_monitor import LoopWatchdog
+from loader import EXTENSION_WAVES, StartupTimings, current_extension, load_extensions
+from permissions import MissingCommandRole, PermissionResolver
+from profiling import Profiler
+from schema import ensure_schema
+from state import create_state_backend
+from storage import Storage
+from web_server import WebServer
+
+# Intervalle (secondes) entre deux rapports de santé envoyés au lanceur de clusters
+HEALTH_INTERVAL = 15
+# Intervalle (secondes) entre deux tentatives de mise à jour du schéma si MongoDB est injoignable au démarrage
+SCHEMA_RETRY_INTERVAL = 60
+
+
+class MyBot(commands.AutoShardedBot):
+    """Bot multi-shards : sans paramètre, discord.py utilise le nombre de shards recommandé par Discord.
+
+    Dans un cluster, chaque processus reçoit sa plage de shards (`shard_ids`) ; seul le cluster
+    principal applique les migrations et synchronise les commandes ; chacun sert ses propres métriques.
+    """
+
+    def __init__(self, *args, cluster_id=0, health_queue=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cluster_id = cluster_id
+        self.primary = cluster_id == 0
+        self.health_queue = health_queue
+        # Mesure de chaque écouteur et commande des cogs (PROFILE_SLOW_MS : seuil des appels lents)
+        self.profiler = Profiler.from_env()
+
+    async def setup_hook(self):
+        self.startup_timings = StartupTimings()
+        # Surveillance des blocages de la boucle dès le démarrage (chargement des extensions compris)
+        self.loop_watchdog = LoopWatchdog.from_env()
+        self.loop_watchdog.start()
+        # Client MongoDB unique, partagé par toutes les extensions (la connexion s'établit au premier appel)
+        self.storage = Storage.from_env()
+        logging.info("Client MongoDB créé (connexion établie au premier accès).")
+        # État anti-abus et sessions (cooldowns, réactions, vocal) : en mémoire ou partagé entre processus
+        self.state = create_state_backend(self.storage)
+        await self.state.start()
+        # Rôles autorisés par commande, partagés par tous les cogs (rechargés périodiquement par XPSystem)
+        self.permission_resolver = PermissionResolver(self.storage["command_roles"])
+        await self.permission_resolver.load()
+        self.tree.error(self.on_app_command_error)
+        # Migrations et index, avant que les extensions n'accèdent aux collections ; MongoDB injoignable
+        # n'empêche pas le démarrage : la mise à jour est retentée en arrière-plan
+        if self.primary:
+            try:
+                await ensure_schema(self.storage)
+            except Exception as e:
+                logging.warning(f"Schéma MongoDB non vérifié au démarrage, nouvel essai en arrière-plan : {e}")
+                self.schema_task = asyncio.create_task(self.retry_schema())
+        # Chargement en parallèle ; une extension en échec est ignorée sans bloquer les autres
+        await load_extensions(self)
+        # Synchronisation une seule fois au démarrage (et non à chaque on_ready), seulement si l'arbre a changé.
+        # DEV_GUILD_ID : synchronisation immédiate sur un serveur de test ; COMMAND_SYNC_FORCE=1 : forcer l'envoi.
+        if self.primary:
+            dev_guild = os.getenv("DEV_GUILD_ID")
+            await sync_commands(self, guild_id=int(dev_guild) if dev_guild else None,
+                                force=os.getenv("COMMAND_SYNC_FORCE") == "1")
+        if self.health_queue is not None:
+            self.health_task = asyncio.create_task(self.report_health())
+        # Santé, disponibilité et métriques, servies par la boucle d'événements du bot
+        self.web_server = WebServer.from_env(self)
+        await self.web_server.start()
+
+    async def retry_schema(self):
+        """Retente les migrations et la création des index jusqu'à ce que MongoDB réponde."""
+        while True:
+            await asyncio.sleep(SCHEMA_RETRY_INTERVAL)
+            try:
+                await ensure_schema(self.storage)
+                return
+            except Exception as e:
+                logging.warning(f"Schéma MongoDB toujours non vérifié, nouvel essai dans {SCHEMA_RETRY_INTERVAL}s : {e}")
+
+    async def on_app_command_error(self, interaction, error):
+        """Refus de permission : message éphémère sans trace d'erreur ; sinon comportement par défaut de l'arbre."""
+        if isinstance(error, MissingCommandRole):
+            logging.info(f"Commande {error.command_name} refusée à l'utilisateur {interaction.user.id}.")
+            message = "Tu n'as pas la permission d'utiliser cette commande."
+            if interaction.response.is_done():
+                await interaction.followup.send(message, ephemeral=True)
+            else:
+                await interaction.response.send_message(message, ephemeral=True)
+            return
+        await app_commands.CommandTree.on_error(self.tree, interaction, error)
+
+    def dispatch(self, event_name, /, *args, **kwargs):
+        EVENTS.inc(event_name)
+        super().dispatch(event_name, *args, **kwargs)
+
+    def instrument_cog(self, cog):
+        """Remplace les écouteurs et les callbacks de commandes du cog par des versions profilées.
+
+        Appelé avant l'enregistrement par add_cog, qui lit les écouteurs sur l'instance du cog.
+        """
+        for method_name in {method_name for _, method_name in cog.__cog_listeners__}:
+            listener = getattr(cog, method_name)
+            setattr(cog, method_name, self.profiler.wrap("listener", f"{cog.qualified_name}.{method_name}", listener))
+
+        # Commandes préfixées et hybrides : le callback reçoit (cog, ctx, ...)
+        for command in cog.walk_commands():
+            # La partie slash d'une commande hybride garde sa propre référence au callback d'origine
+            # (HybridAppCommand._callback, copié à la construction) : elle est profilée séparément
+            if isinstance(command, (commands.HybridCommand, commands.HybridGroup)):
+                app_command = command.app_command
+                if isinstance(command, commands.HybridGroup) and app_command is not None:
+                    app_command = app_command.get_command(command.fallback) if command.fallback else None
+                if app_command is not None:
+                    app_command._callback = self.profiler.wrap("command", f"/{app_command.qualified_name}",
+                                                               app_command._callback, skip=1)
+            command.callback = self.profiler.wrap("command", f"{self.command_prefix}{command.qualified_name}",
+                                                  command.callback, skip=1)
+        # Commandes slash : le callback reçoit (cog, interaction, ...) ; les parties slash des commandes
+        # hybrides sont traitées ci-dessus
+        for command in cog.walk_app_commands():
+            if isinstance(command, app_commands.Command) and not isinstance(command, HybridAppCommand):
+                command._callback = self.profiler.wrap("command", f"/{command.qualified_name}",
+                                                       command._callback, skip=1)
+
+    async def add_cog(self, cog, /, **kwargs):
+        self.instrument_cog(cog)
+        # Mesure du cog_load pour le rapport de démarrage
+        started = time.perf_counter()
+        extension = current_extension.get()
+        timings = getattr(self, "startup_timings", None)
+        if timings and extension:
+            timings.cog_added(extension, started)
+        await super().add_cog(cog, **kwargs)
+        if timings and extension:
+            timings.cog_loaded(extension, time.perf_counter() - started)
+
+    async def on_ready(self):
+        timings = getattr(self, "startup_timings", None)
+        if timings and timings.gateway_ready is None:
+            timings.gateway_ready = time.perf_counter() - timings.started
+            logging.info(timings.report())
+            logging.info(cache_footprint(self))
+        """await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.playing, name =f"{bot.command_prefix}help"))"""
+        logging.info(f'Lancé en tant que {self.user} (shards {sorted(self.shards)} sur {self.shard_count}) !')
+        logging.info(f"discord.py version: {discord.__version__}")
+
+    async def on_shard_ready(self, shard_id):
+        logging.info(f"Shard {shard_id} prêt.")
+
+    async def on_shard_disconnect(self, shard_id):
+        logging.warning(f"Shard {shard_id} déconnecté.")
+
+    def shard_health(self):
+        """État de chaque shard du processus : latence (ms, None avant le premier heartbeat), connexion, limitation."""
+        shards = {}
+        for shard_id, shard in self.shards.items():
+            latency = shard.latency
+            shards[shard_id] = {
+                "latency_ms": round(latency * 1000, 1) if math.isfinite(latency) else None,
+                "connected": not shard.is_closed(),
+                "rate_limited": shard.is_ws_ratelimited(),
+                "guilds": sum(1 for guild in self.guilds if guild.shard_id == shard_id),
+            }
+        return {
+            "cluster": self.cluster_id,
+            "pid": os.getpid(),
+            "ready": self.is_ready(),
+            "shards": shards,
+        }
+
+    async def report_health(self):
+        """Envoie périodiquement l'état des shards au lanceur de clusters."""
+        while not self.is_closed():
+            try:
+                self.health_queue.put_nowait(self.shard_health())
+            except Exception as e:
+                logging.warning(f"Rapport de santé non envoyé : {e}")
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+    async def close(self):
+        web_server = getattr(self, "web_server", None)
+        if web_server is not None:
+            await web_server.stop()
+        schema_task = getattr(self, "schema_task", None)
+        if schema_task is not None:
+            schema_task.cancel()
+        loop_watchdog = getattr(self, "loop_watchdog", None)
+        if loop_watchdog is not None:
+            loop_watchdog.stop()
+        # Les extensions sont déchargées (et leurs tampons vidés) avant la fermeture du client
+        await super().close()
+        state = getattr(self, "state", None)
+        if state is not None:
+            await state.close()
+        storage = getattr(self, "storage", None)
+        if storage is not None:
+            storage.close()
+
+
+def run_bot(token, shard_ids=None, shard_count=None, cluster_id=0, health_queue=None):
+    """Construit et lance le bot ; bloque jusqu'à son arrêt."""
+    # Intents et politique de cache déduits des extensions chargées (surchargeables par variables d'environnement)
+    options = client_options([extension for wave in EXTENSION_WAVES for extension in wave])
+    bot = MyBot(
+        command_prefix='.',
+        shard_ids=shard_ids,
+        shard_count=shard_count,
+        cluster_id=cluster_id,
+        health_queue=health_queue,
+        **options,
+    )
+    bot.run(token=token)
@@ -0,0 +1,194 @@
+"""Lanceur multi-processus : répartit les shards du bot sur plusieurs processus d'une même machine.
+
+Exemple, en local : python cluster.py --shards 4 --clusters 2
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+from dotenv import load_dotenv
+
+from bot import HEALTH_INTERVAL
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Délai maximal avant de redémarrer un processus arrêté (doublé à chaque arrêt rapproché)
+MAX_RESTART_DELAY = 300
+# Un cluster sans rapport depuis ce nombre d'intervalles est signalé
+STALE_REPORTS = 3
+# Secondes entre deux vérifications des processus (arrêts, redémarrages programmés)
+POLL_INTERVAL = 1
+
+
+def shard_ranges(shard_count, clusters):
+    """Découpe les shards 0..shard_count-1 en plages contiguës, une par cluster."""
+    clusters = max(1, min(clusters, shard_count))
+    size, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for cluster_id in range(clusters):
+        end = start + size + (1 if cluster_id < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+def interrupt(signum, frame):
+    # bot.run() ferme proprement le bot (déchargement des extensions, écriture des tampons) sur KeyboardInterrupt ;
+    # les signaux suivants sont ignorés pour ne pas interrompre cette fermeture
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+
+def run_worker(cluster_id, shard_ids, shard_count, health_queue):
+    """Point d'entrée d'un processus du cluster."""
+    signal.signal(signal.SIGINT, interrupt)
+    signal.signal(signal.SIGTERM, interrupt)
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s - cluster {cluster_id} - %(levelname)s - %(message)s')
+    from bot import run_bot
+    run_bot(
+        os.getenv('708_TOKEN'),
+        shard_ids=shard_ids,
+        shard_count=shard_count,
+        cluster_id=cluster_id,
+        health_queue=health_queue,
+    )
+
+
+class ClusterLauncher:
+    """Démarre un processus par plage de shards, le surveille et le redémarre s'il s'arrête."""
+
+    def __init__(self, shard_count, clusters, report_interval=60):
+        self.shard_count = shard_count
+        self.ranges = shard_ranges(shard_count, clusters)
+        self.report_interval = report_interval
+        self.context = multiprocessing.get_context("spawn")
+        self.health_queue = self.context.Queue()
+        self.processes = {}  # cluster -> Process
+        self.restarts = {}   # cluster -> (nombre de redémarrages rapprochés, instant du dernier démarrage)
+        self.restart_at = {}  # cluster arrêté -> instant (time.monotonic) de son redémarrage programmé
+        self.health = {}     # cluster -> (instant de réception, dernier rapport)
+
+    def start_cluster(self, cluster_id):
+        shard_ids = self.ranges[cluster_id]
+        process = self.context.Process(
+            target=run_worker,
+            args=(cluster_id, shard_ids, self.shard_count, self.health_queue),
+            name=f"cluster-{cluster_id}",
+        )
+        process.start()
+        self.processes[cluster_id] = process
+        failures, _ = self.restarts.get(cluster_id, (0, 0))
+        self.restarts[cluster_id] = (failures, time.monotonic())
+        logging.info(f"Cluster {cluster_id} démarré (pid {process.pid}, shards {shard_ids}).")
+
+    def restart_delay(self, cluster_id):
+        """Attente avant redémarrage : nulle après une longue exécution, croissante si le cluster plante en boucle."""
+        failures, started = self.restarts.get(cluster_id, (0, 0))
+        # La durée d'exécution est mesurée depuis le démarrage effectif, attente de redémarrage exclue
+        failures = failures + 1 if time.monotonic() - started < MAX_RESTART_DELAY else 0
+        self.restarts[cluster_id] = (failures, started)
+        return min(MAX_RESTART_DELAY, 2 ** failures - 1)
+
+    def check_processes(self):
+        """Programme le redémarrage des processus arrêtés et relance ceux dont l'attente est écoulée.
+
+        Sans attente bloquante : les autres clusters restent surveillés pendant qu'un cluster patiente.
+        """
+        now = time.monotonic()
+        for cluster_id, process in list(self.processes.items()):
+            if process.is_alive() or cluster_id in self.restart_at:
+                continue
+            delay = self.restart_delay(cluster_id)
+            logging.error(f"Cluster {cluster_id} arrêté (code {process.exitcode}), redémarrage dans {delay}s.")
+            self.health.pop(cluster_id, None)
+            self.restart_at[cluster_id] = now + delay
+        for cluster_id, restart_at in list(self.restart_at.items()):
+            if now >= restart_at:
+                del self.restart_at[cluster_id]
+                self.start_cluster(cluster_id)
+
+    def drain_reports(self, timeout):
+        """Lit les rapports de santé envoyés par les processus pendant au plus `timeout` secondes."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                report = self.health_queue.get(timeout=remaining)
+            except queue.Empty:
+                return
+            self.health[report["cluster"]] = (time.monotonic(), report)
+
+    def log_health(self):
+        """Journalise la latence et l'état de chaque shard, cluster par cluster."""
+        now = time.monotonic()
+        lines = ["État des shards :"]
+        for cluster_id, shard_ids in enumerate(self.ranges):
+            received, report = self.health.get(cluster_id, (None, None))
+            if report is None:
+                lines.append(f"  cluster {cluster_id} : aucun rapport reçu (shards {shard_ids})")
+                continue
+            stale = now - received > STALE_REPORTS * HEALTH_INTERVAL
+            lines.append(
+                f"  cluster {cluster_id} (pid {report['pid']}) : {'prêt' if report['ready'] else 'en démarrage'}"
+                + (f", dernier rapport il y a {now - received:.0f}s" if stale else "")
+            )
+            for shard_id, shard in sorted(report["shards"].items()):
+                latency = f"{shard['latency_ms']} ms" if shard["latency_ms"] is not None else "-"
+                state = "connecté" if shard["connected"] else "déconnecté"
+                if shard["rate_limited"]:
+                    state += ", limité"
+                lines.append(f"    shard {shard_id} : {latency}, {state}, {shard['guilds']} serveur(s)")
+        logging.info("\n".join(lines))
+
+    def run(self):
+        for cluster_id in range(len(self.ranges)):
+            self.start_cluster(cluster_id)
+        next_report = time.monotonic() + self.report_interval
+        try:
+            while True:
+                self.drain_reports(POLL_INTERVAL)
+                self.check_processes()
+                if time.monotonic() >= next_report:
+                    self.log_health()
+                    next_report += self.report_interval
+        except KeyboardInterrupt:
+            logging.info("Arrêt du cluster...")
+        finally:
+            self.stop()
+
+    def stop(self, grace=30):
+        """Demande l'arrêt propre de chaque processus, puis force ceux qui n'ont pas terminé après `grace` secondes."""
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + grace
+        for process in self.processes.values():
+            process.join(timeout=max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                logging.warning(f"{process.name} ne répond pas, arrêt forcé.")
+                process.kill()
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Lance le bot sur plusieurs processus, chacun gérant une plage de shards.")
+    parser.add_argument("--shards", type=int, default=int(os.getenv("SHARD_COUNT", 2)),
+                        help="Nombre total de shards (défaut : SHARD_COUNT ou 2).")
+    parser.add_argument("--clusters", type=int, default=int(os.getenv("CLUSTER_COUNT", os.cpu_count() or 1)),
+                        help="Nombre de processus (défaut : CLUSTER_COUNT ou nombre de cœurs, au plus un par shard).")
+    parser.add_argument("--report-interval", type=int, default=60,
+                        help="Secondes entre deux journaux de l'état des shards.")
+    args = parser.parse_args()
+    ClusterLauncher(args.shards, args.clusters, args.report_interval).run()
+
+
+if __name__ == "__main__":
+    main()
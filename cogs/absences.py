@@ -1,8 +1,7 @@
 import discord
+import logging
 from discord.ext import commands, tasks
 from discord import app_commands
-from pymongo import MongoClient #type:ignore
-import os
 from datetime import datetime, timedelta
 
 OWNER_ID = 463639826361614336
@@ -10,17 +9,21 @@ OWNER_ID = 463639826361614336
 class AbsenceSystem(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.mongo_uri = os.getenv("MONGO_URI")
-        self.client = MongoClient(self.mongo_uri)
-        self.db = self.client["discord_bot"]
-        self.absence_collection = self.db["absences"]
-        self.channel_collection = self.db["absence_channel"]
+        # Client MongoDB partagé, créé et fermé par le bot
+        self.storage = bot.storage
+        self.absence_collection = self.storage["absences"]
+        self.channel_collection = self.storage["absence_channel"]
+
+    async def cog_load(self):
         self.check_absences.start()
+
+    async def cog_unload(self):
+        self.check_absences.cancel()
     
     @app_commands.command(name="absence-channel", description="Définit le salon où seront envoyées les absences.")
     async def set_absence_channel(self, interaction: discord.Interaction, channel: discord.TextChannel):
         if interaction.user.guild_permissions.administrator or interaction.user.id == OWNER_ID:
-            self.channel_collection.update_one({}, {"$set": {"channel_id": channel.id}}, upsert=True)
+            await self.channel_collection.update_one({}, {"$set": {"channel_id": channel.id}}, upsert=True)
             await interaction.response.send_message(f"✅ Salon des absences défini sur {channel.mention}.", ephemeral=True)
         else:
             await interaction.response.send_message("⛔ Seuls les administrateurs peuvent utiliser cette commande.", ephemeral=True)
@@ -44,13 +47,13 @@ class AbsenceSystem(commands.Cog):
                         await interaction.response.send_message("⚠️ La date de fin doit être après la date de début !", ephemeral=True)
                         return
                     duration = (end - start).days
-                    channel_data = interaction.client.get_cog("AbsenceSystem").channel_collection.find_one({})
+                    channel_data = await interaction.client.get_cog("AbsenceSystem").channel_collection.find_one({})
                     if not channel_data:
                         await interaction.response.send_message("⚠️ Aucun salon d'absence défini.", ephemeral=True)
                         return
                     channel = interaction.guild.get_channel(channel_data["channel_id"])
                     message = await channel.send(f"**Absence de:** {interaction.user.mention}\n**Durée:** {duration} jours (`{start.date()} -> {end.date()}`)\n**Raison:** {self.reason.value}")
-                    interaction.client.get_cog("AbsenceSystem").absence_collection.insert_one({"user_id": interaction.user.id, "start": start, "end": end, "message_id": message.id})
+                    await interaction.client.get_cog("AbsenceSystem").absence_collection.insert_one({"user_id": interaction.user.id, "guild_id": interaction.guild.id, "start": start, "end": end, "message_id": message.id})
                     await interaction.response.send_message("✅ Absence enregistrée avec succès !", ephemeral=True)
                 except ValueError:
                     await interaction.response.send_message("⚠️ Format de date invalide. Utilisez JJ-MM-AAAA.", ephemeral=True)
@@ -63,9 +66,9 @@ class AbsenceSystem(commands.Cog):
             query_user = user.id
         else:
             query_user = interaction.user.id
-        absence = self.absence_collection.find_one({"user_id": query_user})
+        absence = await self.absence_collection.find_one({"user_id": query_user})
         if absence:
-            self.absence_collection.delete_one({"user_id": query_user})
+            await self.absence_collection.delete_one({"user_id": query_user})
             await interaction.response.send_message(f"✅ Absence de {user.mention if user else interaction.user.mention} supprimée.", ephemeral=True)
         else:
             await interaction.response.send_message("⚠️ Aucune absence trouvée.", ephemeral=True)
@@ -73,10 +76,16 @@ class AbsenceSystem(commands.Cog):
     @tasks.loop(minutes=60)
     async def check_absences(self):
         now = datetime.now()
-        expired_absences = self.absence_collection.find({"end": {"$lte": now}})
+        expired_absences = await self.absence_collection.find({"end": {"$lte": now}})
         for absence in expired_absences:
+            if "guild_id" not in absence:
+                # Absence enregistrée avant l'ajout du serveur : impossible de savoir où envoyer le rappel
+                await self.absence_collection.delete_one({"_id": absence["_id"]})
+                continue
             guild = self.bot.get_guild(absence["guild_id"])
-            channel_data = self.channel_collection.find_one({})
+            if guild is None:
+                continue  # Serveur géré par un autre processus du cluster
+            channel_data = await self.channel_collection.find_one({})
             if channel_data:
                 channel = guild.get_channel(channel_data["channel_id"])
                 try:
@@ -84,12 +93,22 @@ class AbsenceSystem(commands.Cog):
                     await message.delete()
                 except discord.NotFound:
                     pass
+                # Les membres ne sont pas tous en cache (chargement des membres désactivé par défaut)
                 user = guild.get_member(absence["user_id"])
+                if user is None:
+                    try:
+                        user = await guild.fetch_member(absence["user_id"])
+                    except discord.NotFound:
+                        user = None  # Le membre a quitté le serveur : l'absence est supprimée sans rappel
+                    except discord.HTTPException as e:
+                        # Erreur temporaire : l'absence est conservée, le rappel sera retenté au prochain passage
+                        logging.warning(f"Membre {absence['user_id']} non récupéré pour le rappel d'absence : {e}")
+                        continue
                 if user:
                     reminder_msg = await channel.send(f"{user.mention} ton absence est terminée ! Confirme ton retour avec ✅ ou ❌.")
                     await reminder_msg.add_reaction("✅")
                     await reminder_msg.add_reaction("❌")
-            self.absence_collection.delete_one({"_id": absence["_id"]})
+            await self.absence_collection.delete_one({"_id": absence["_id"]})
 
     @check_absences.before_loop
     async def before_check_absences(self):
@@ -0,0 +1,213 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+from pymongo import UpdateOne # type: ignore
+import logging
+import asyncio
+import bisect
+import random
+import time
+from cogs.xp_system import COOLDOWNS, XP_LIMITS
+
+# Configuration des logs
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# ID de l'utilisateur autorisé
+OWNER_ID = 463639826361614336
+
+# Paramètres du rattrapage de l'historique
+BACKFILL = {
+    "concurrency": 3,         # Salons parcourus en parallèle
+    "batch_size": 100,        # Messages traités par lot (une page de l'API Discord)
+    "progress_interval": 5,   # Secondes minimum entre deux rapports de progression
+}
+
+class Backfill(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+        # Client MongoDB partagé, créé et fermé par le bot
+        self.storage = bot.storage
+        self.checkpoints = self.storage["backfill_checkpoints"]  # Avancement par salon
+
+        self.lock = asyncio.Lock()
+        # Limite haute d'un premier rattrapage : les messages suivants sont déjà comptés par MessageIngest.
+        # Elle est enregistrée dans le point de contrôle du salon et réutilisée lors d'une reprise.
+        self.cutoff = discord.utils.time_snowflake(discord.utils.utcnow())
+
+    def score_batch(self, messages, rewarded_at, xp_cog, genance_cog, ignored):
+        """Applique les règles d'XP et de gênance à un lot de messages et retourne les gains par utilisateur."""
+        xp_gains = {}
+        genance_gains = {}
+        if genance_cog:
+            matcher, points = genance_cog.matcher, genance_cog.points
+
+        for message in messages:
+            if message.author.bot:
+                continue
+            user_id = str(message.author.id)
+
+            # XP : même délai minimum entre deux messages récompensés que le gain en direct, tous salons
+            # confondus ; les salons étant parcourus en parallèle, les instants récompensés sont gardés triés
+            if xp_cog and not ignored:
+                times = rewarded_at.setdefault(user_id, [])
+                created = message.created_at.timestamp()
+                index = bisect.bisect_left(times, created)
+                previous_ok = index == 0 or created - times[index - 1] >= COOLDOWNS["message"]
+                next_ok = index == len(times) or times[index] - created >= COOLDOWNS["message"]
+                if previous_ok and next_ok:
+                    times.insert(index, created)
+                    xp_gains[user_id] = xp_gains.get(user_id, 0) + random.randint(
+                        XP_LIMITS["message"]["min"], XP_LIMITS["message"]["max"]
+                    )
+
+            # Gênance : premier mot détecté, sauf si le message contient un mot exclu
+            if genance_cog:
+                result = matcher.scan(message.content)
+                if result.words and not result.excluded:
+                    word = result.words[0]
+                    gains = genance_gains.setdefault(user_id, {"genance_points": 0})
+                    gains["genance_points"] += points[word]
+                    gains[f"words.{word}"] = gains.get(f"words.{word}", 0) + 1
+
+        return xp_gains, genance_gains
+
+    async def write_gains(self, xp_gains, genance_gains, xp_cog):
+        """Écrit les gains d'un lot avec des upserts groupés."""
+        if xp_gains:
+            await self.storage["xp_data"].bulk_write([
+                UpdateOne({"user_id": user_id}, {"$inc": {"xp": xp}, "$setOnInsert": {"level": 1}}, upsert=True)
+                for user_id, xp in xp_gains.items()
+            ], ordered=False)
+            # Les totaux gardés en mémoire par XPSystem doivent refléter ces gains
+            xp_cog.xp_buffer.apply_external(xp_gains)
+        if genance_gains:
+            await self.storage["genance_data"].bulk_write([
+                UpdateOne({"user_id": user_id}, {"$inc": gains}, upsert=True)
+                for user_id, gains in genance_gains.items()
+            ], ordered=False)
+
+    async def backfill_channel(self, channel, semaphore, stats, rewarded_at, reset=False):
+        """Parcourt l'historique d'un salon depuis son dernier point de contrôle (ou depuis le début si `reset`)."""
+        async with semaphore:
+            if reset:
+                await self.checkpoints.delete_one({"channel_id": channel.id})
+                checkpoint = None
+            else:
+                checkpoint = await self.checkpoints.find_one({"channel_id": channel.id})
+            if checkpoint and checkpoint.get("done"):
+                return
+
+            xp_cog = self.bot.get_cog("XPSystem")
+            genance_cog = self.bot.get_cog("GenanceSystem")
+            ignored = xp_cog.is_channel_ignored(channel.id) if xp_cog else True
+            after = discord.Object(checkpoint["last_message_id"]) if checkpoint and "last_message_id" in checkpoint else None
+            batch = []
+
+            async def flush_batch():
+                xp_gains, genance_gains = self.score_batch(batch, rewarded_at, xp_cog, genance_cog, ignored)
+                await self.write_gains(xp_gains, genance_gains, xp_cog)
+                # Le point de contrôle n'avance qu'une fois les gains du lot écrits
+                await self.checkpoints.update_one(
+                    {"channel_id": channel.id},
+                    {"$set": {"last_message_id": batch[-1].id}, "$inc": {"messages": len(batch)}},
+                    upsert=True
+                )
+                stats["messages"] += len(batch)
+                batch.clear()
+
+            try:
+                if checkpoint is None:
+                    cutoff = self.cutoff
+                    await self.checkpoints.update_one({"channel_id": channel.id}, {"$set": {"cutoff": cutoff}}, upsert=True)
+                else:
+                    cutoff = checkpoint.get("cutoff", self.cutoff)
+                before = discord.Object(cutoff)
+                # discord.py attend de lui-même la fin des limites de débit (429) entre les pages
+                async for message in channel.history(limit=None, after=after, before=before, oldest_first=True):
+                    batch.append(message)
+                    if len(batch) >= BACKFILL["batch_size"]:
+                        await flush_batch()
+                if batch:
+                    await flush_batch()
+                await self.checkpoints.update_one({"channel_id": channel.id}, {"$set": {"done": True}}, upsert=True)
+                stats["channels"] += 1
+            except discord.Forbidden:
+                logging.warning(f"Accès refusé à l'historique du salon {channel.id}, salon ignoré.")
+            except Exception as e:
+                stats["errors"] += 1
+                logging.error(f"Erreur lors du rattrapage du salon {channel.id} (reprise possible) : {e}")
+
+    @app_commands.command(name="backfill", description="Attribue l'XP et les points de gênance des messages déjà envoyés.")
+    @app_commands.describe(
+        channel="Le salon à parcourir (tous les salons textuels si vide).",
+        reset="Oublie les points de contrôle et reparcourt tout l'historique (les gains sont de nouveau attribués).",
+    )
+    @app_commands.guild_only()
+    async def backfill(self, interaction: discord.Interaction, channel: discord.TextChannel = None, reset: bool = False):
+        """Parcourt l'historique des salons et attribue l'XP et la gênance, en reprenant où il s'était arrêté."""
+        if interaction.user.id != OWNER_ID:
+            await interaction.response.send_message("⛔ Seul l'administrateur peut utiliser cette commande !", ephemeral=True)
+            return
+        if self.lock.locked():
+            await interaction.response.send_message("⚠️ Un rattrapage est déjà en cours.", ephemeral=True)
+            return
+
+        xp_cog = self.bot.get_cog("XPSystem")
+        if not xp_cog and not self.bot.get_cog("GenanceSystem"):
+            await interaction.response.send_message("⚠️ Ni le système d'XP ni celui de gênance ne sont chargés.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        channels = [channel] if channel else [
+            text_channel for text_channel in interaction.guild.text_channels
+            if text_channel.permissions_for(interaction.guild.me).read_message_history
+        ]
+        stats = {"messages": 0, "channels": 0, "errors": 0}
+        # Délai entre deux gains d'XP suivi par utilisateur pour tout le rattrapage, pas par salon
+        rewarded_at = {}
+        started = time.monotonic()
+
+        async def report(content):
+            # Le jeton de l'interaction expire après 15 minutes : un rattrapage plus long continue sans rapport
+            try:
+                await interaction.edit_original_response(content=content)
+            except discord.HTTPException as e:
+                logging.debug(f"Progression du rattrapage non affichée : {e}")
+
+        async with self.lock:
+            if xp_cog:
+                # Les gains en attente sont écrits avant que le rattrapage n'écrive directement dans xp_data
+                await xp_cog.xp_buffer.flush(xp_cog.calculate_level)
+
+            semaphore = asyncio.Semaphore(BACKFILL["concurrency"])
+            tasks = [asyncio.create_task(self.backfill_channel(target, semaphore, stats, rewarded_at, reset)) for target in channels]
+            try:
+                while not all(task.done() for task in tasks):
+                    await asyncio.wait(tasks, timeout=BACKFILL["progress_interval"])
+                    elapsed = time.monotonic() - started
+                    await report(
+                        f"⏳ Rattrapage : {stats['channels']}/{len(channels)} salon(s), {stats['messages']} message(s) "
+                        f"({stats['messages'] / max(elapsed, 1):.0f} msg/s)."
+                    )
+            finally:
+                # Aucun salon ne doit continuer à écrire une fois le verrou libéré
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+            # Les niveaux sont recalculés une fois pour toute l'XP ajoutée
+            if xp_cog and stats["messages"]:
+                async with xp_cog.level_job_lock:
+                    await xp_cog.recompute_levels()
+
+        elapsed = time.monotonic() - started
+        logging.info(f"Rattrapage terminé en {elapsed:.0f} s : {stats['messages']} message(s), {stats['errors']} erreur(s).")
+        await report(
+            f"✅ Rattrapage terminé en {elapsed:.0f} s : {stats['messages']} message(s) dans "
+            f"{stats['channels']}/{len(channels)} salon(s)"
+            + (f", {stats['errors']} erreur(s) (relance la commande pour reprendre)." if stats["errors"] else ".")
+        )
+
+async def setup(bot):
+    await bot.add_cog(Backfill(bot))
@@ -0,0 +1,72 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+
+OWNER_ID = 463639826361614336
+
+# Nombre de cadres affichés par pile dans /loop-lag (les plus profonds, où la boucle était bloquée)
+SHOWN_FRAMES = 4
+
+class Diagnostics(commands.Cog):
+    """Commandes de diagnostic des performances du bot, réservées au propriétaire."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @app_commands.command(name="profile", description="Affiche les écouteurs et commandes les plus coûteux.")
+    @app_commands.describe(limit="Nombre de gestionnaires à afficher.")
+    async def profile(self, interaction: discord.Interaction, limit: app_commands.Range[int, 1, 25] = 10):
+        """Temps total, moyen et maximal de chaque gestionnaire, avec la part passée à s'exécuter sur la boucle."""
+        if interaction.user.id != OWNER_ID:
+            await interaction.response.send_message("⛔ Seul l'administrateur peut utiliser cette commande !", ephemeral=True)
+            return
+
+        rows = self.bot.profiler.report(limit)
+        if not rows:
+            await interaction.response.send_message("Aucun appel mesuré pour le moment.", ephemeral=True)
+            return
+        threshold = self.bot.profiler.slow_threshold * 1000
+        lines = [
+            f"- `{row['handler']}` : {row['calls']} appel(s), {row['avg_ms']:.1f} ms en moyenne, "
+            f"{row['max_ms']:.0f} ms max, {row['busy_ms'] / row['total_ms'] * 100 if row['total_ms'] else 0:.0f} % actif"
+            + (f", {row['slow']} lent(s)" if row["slow"] else "")
+            + (f", {row['errors']} erreur(s)" if row["errors"] else "")
+            for row in rows
+        ]
+        await interaction.response.send_message(
+            f"⏱️ **Profil des gestionnaires** (seuil lent : {threshold:.0f} ms)\n" + "\n".join(lines), ephemeral=True
+        )
+
+    @app_commands.command(name="loop-lag", description="Affiche les piles qui ont bloqué la boucle d'événements.")
+    @app_commands.describe(reset="Remet le rapport à zéro après l'affichage.")
+    async def loop_lag(self, interaction: discord.Interaction, reset: bool = False):
+        """Piles échantillonnées pendant les blocages de la boucle, triées par durée cumulée."""
+        if interaction.user.id != OWNER_ID:
+            await interaction.response.send_message("⛔ Seul l'administrateur peut utiliser cette commande !", ephemeral=True)
+            return
+
+        watchdog = self.bot.loop_watchdog
+        header = (
+            f"🐢 **Blocages de la boucle** (seuil : {watchdog.threshold * 1000:.0f} ms, "
+            f"pire retard : {watchdog.worst_lag * 1000:.0f} ms)"
+        )
+        blocks = []
+        for entry in watchdog.report():
+            frames = "\n".join(entry["stack"][-SHOWN_FRAMES:])
+            blocks.append(
+                f"**{entry['total_ms']:.0f} ms** au total, {entry['stalls']} blocage(s), "
+                f"{entry['samples']} échantillon(s), pire {entry['worst_ms']:.0f} ms\n```\n{frames}\n```"
+            )
+        if reset:
+            watchdog.reset()
+
+        message = header
+        for block in blocks or ["Aucun blocage détecté."]:
+            # Limite de 2000 caractères d'un message Discord
+            if len(message) + len(block) + 1 > 1990:
+                break
+            message += "\n" + block
+        await interaction.response.send_message(message, ephemeral=True)
+
+async def setup(bot):
+    await bot.add_cog(Diagnostics(bot))
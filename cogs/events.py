@@ -1,8 +1,6 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from pymongo import MongoClient #type: ignore
-import os
 import logging
 
 # Configuration des logs
@@ -15,25 +13,14 @@ class EventsSystem(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         
-        # Connexion à MongoDB
-        self.mongo_uri = os.getenv("MONGO_URI")
-        if not self.mongo_uri:
-            logging.error("Erreur : URI MongoDB non configurée dans les variables d'environnement.")
-            raise ValueError("La variable d'environnement MONGO_URI est obligatoire.")
-        
-        try:
-            self.client = MongoClient(self.mongo_uri)
-            self.db = self.client["discord_bot"]
-            self.events_collection = self.db["events"]  # Stocke les événements
-            self.participants_collection = self.db["event_participants"]  # Stocke les participations
-            logging.info("Connexion à MongoDB réussie.")
-        except Exception as e:
-            logging.error(f"Erreur lors de la connexion à MongoDB : {e}")
-            raise
+        # Client MongoDB partagé, créé et fermé par le bot
+        self.storage = bot.storage
+        self.events_collection = self.storage["events"]  # Stocke les événements
+        self.participants_collection = self.storage["event_participants"]  # Stocke les participations
     
     async def autocomplete_events(self, interaction: discord.Interaction, current: str):
         """Retourne la liste des événements existants pour l'auto-complétion."""
-        events = self.events_collection.find()
+        events = await self.events_collection.find()
         return [app_commands.Choice(name=event["name"], value=event["name"]) for event in events if current.lower() in event["name"].lower()]
     
     @app_commands.command(name="event-add", description="Ajoute un nouvel événement organisé.")
@@ -43,11 +30,11 @@ class EventsSystem(commands.Cog):
             await interaction.response.send_message("⛔ Seul l'administrateur peut utiliser cette commande !", ephemeral=True)
             return
         
-        if self.events_collection.find_one({"name": event_name}):
+        if await self.events_collection.find_one({"name": event_name}):
             await interaction.response.send_message("⚠️ Cet événement existe déjà !", ephemeral=True)
             return
         
-        self.events_collection.insert_one({"name": event_name})
+        await self.events_collection.insert_one({"name": event_name})
         await interaction.response.send_message(f"✅ Événement **{event_name}** ajouté avec succès !", ephemeral=True)
     
     @app_commands.command(name="event-remove", description="Supprime un événement existant.")
@@ -58,12 +45,12 @@ class EventsSystem(commands.Cog):
             await interaction.response.send_message("⛔ Seul l'administrateur peut utiliser cette commande !", ephemeral=True)
             return
         
-        if not self.events_collection.find_one({"name": event_name}):
+        if not await self.events_collection.find_one({"name": event_name}):
             await interaction.response.send_message("⚠️ Cet événement n'existe pas !", ephemeral=True)
             return
         
-        self.events_collection.delete_one({"name": event_name})
-        self.participants_collection.delete_many({"event_name": event_name})
+        await self.events_collection.delete_one({"name": event_name})
+        await self.participants_collection.delete_many({"event_name": event_name})
         await interaction.response.send_message(f"✅ Événement **{event_name}** supprimé avec succès !", ephemeral=True)
     
     @app_commands.command(name="event-define", description="Ajoute ou retire un utilisateur d'un événement existant.")
@@ -74,18 +61,18 @@ class EventsSystem(commands.Cog):
             await interaction.response.send_message("⛔ Seul l'administrateur peut utiliser cette commande !", ephemeral=True)
             return
         
-        if not self.events_collection.find_one({"name": event_name}):
+        if not await self.events_collection.find_one({"name": event_name}):
             await interaction.response.send_message("⚠️ Cet événement n'existe pas !", ephemeral=True)
             return
         
         user_id = str(user.id)
-        existing_participation = self.participants_collection.find_one({"user_id": user_id, "event_name": event_name})
+        existing_participation = await self.participants_collection.find_one({"user_id": user_id, "event_name": event_name})
         
         if existing_participation:
-            self.participants_collection.delete_one({"user_id": user_id, "event_name": event_name})
+            await self.participants_collection.delete_one({"user_id": user_id, "event_name": event_name})
             await interaction.response.send_message(f"❌ {user.mention} a été retiré de l'événement **{event_name}**.", ephemeral=True)
         else:
-            self.participants_collection.insert_one({"user_id": user_id, "event_name": event_name})
+            await self.participants_collection.insert_one({"user_id": user_id, "event_name": event_name})
             await interaction.response.send_message(f"✅ {user.mention} a été ajouté à l'événement **{event_name}**.", ephemeral=True)
     
     @app_commands.command(name="events", description="Affiche la liste des événements auxquels un utilisateur a participé.")
@@ -94,7 +81,7 @@ class EventsSystem(commands.Cog):
         member = member or interaction.user
         user_id = str(member.id)
         
-        events = self.participants_collection.find({"user_id": user_id})
+        events = await self.participants_collection.find({"user_id": user_id})
         event_names = [event["event_name"] for event in events]
         
         if event_names:
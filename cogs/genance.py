@@ -1,14 +1,17 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
-from pymongo import MongoClient # type: ignore
-import os
 import logging
-import re
+import asyncio
+import time
+from pymongo import DESCENDING, ReturnDocument # type: ignore
+from genance_matcher import GenanceMatcher
+from permissions import require_command_role
 
 # Configuration des logs
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Dictionnaire par défaut, copié dans MongoDB (collection genance_config) au premier lancement
 # Liste des mots gênants et des points attribués
 GENANCE_WORDS = {
     "feur": 5,
@@ -43,121 +46,266 @@ LETTER_SUBSTITUTIONS = {
     "c": "[cç]",
 }
 
-def build_advanced_pattern(word):
-    """
-    Construit une regex avancée pour capturer les variantes d'un mot.
-    - Permet des substitutions de lettres (par exemple, "e" ↔ "3").
-    - Autorise des répétitions de lettres.
-    - Détecte les mots intégrés dans d'autres (par exemple, "superfeur").
-    """
-    pattern = ""
-    for char in word:
-        if char in LETTER_SUBSTITUTIONS:
-            pattern += LETTER_SUBSTITUTIONS[char] + "+"
-        else:
-            pattern += char + "+"
-    return rf"{pattern}"
+# Identifiant du document de configuration et intervalle de vérification de sa version
+DICTIONARY_ID = "dictionary"
+DICTIONARY_SYNC = 60
+
+# Classement des plus gênants : nombre d'utilisateurs affichés et durée du cache (secondes)
+TOP = {"size": 10, "ttl": 60}
 
 class GenanceSystem(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
-        # Connexion à MongoDB
-        self.mongo_uri = os.getenv("MONGO_URI")
-        if not self.mongo_uri:
-            logging.error("Erreur : URI MongoDB non configurée dans les variables d'environnement.")
-            raise ValueError("La variable d'environnement MONGO_URI est obligatoire.")
-        
+        # Client MongoDB partagé, créé et fermé par le bot
+        self.storage = bot.storage
+        self.collection = self.storage["genance_data"]
+
+        self.config_collection = self.storage["genance_config"]
+
+        # Automate unique pour les mots gênants et les mots exclus, remplacé en bloc à chaque changement
+        self.matcher = GenanceMatcher(GENANCE_WORDS, EXCLUDED_WORDS, LETTER_SUBSTITUTIONS)
+        self.points = dict(GENANCE_WORDS)
+        self.dictionary_version = 0
+        self.rebuild_lock = asyncio.Lock()
+
+        # Cache du classement /genance-top : (expiration en time.monotonic, entrées)
+        self.top_cache = (0, [])
+
+    async def cog_load(self):
+        # Copie du dictionnaire par défaut si la configuration n'existe pas encore
+        await self.config_collection.update_one(
+            {"_id": DICTIONARY_ID},
+            {"$setOnInsert": {
+                "words": [{"word": word, "points": points} for word, points in GENANCE_WORDS.items()],
+                "excluded": EXCLUDED_WORDS,
+                "substitutions": LETTER_SUBSTITUTIONS,
+                "version": 1,
+            }},
+            upsert=True
+        )
+        await self.reload_dictionary()
+        self.sync_dictionary.start()
+        ingest = self.bot.get_cog("MessageIngest")
+        if ingest:
+            ingest.register("genance", self.handle_message)
+        else:
+            logging.warning("MessageIngest n'est pas chargé : les messages ne sont pas analysés.")
+
+    async def cog_unload(self):
+        ingest = self.bot.get_cog("MessageIngest")
+        if ingest:
+            ingest.unregister("genance")
+        self.sync_dictionary.cancel()
+
+    async def reload_dictionary(self):
+        """Recharge le dictionnaire depuis MongoDB et reconstruit l'automate si sa version a changé."""
+        async with self.rebuild_lock:
+            config = await self.config_collection.find_one({"_id": DICTIONARY_ID})
+            if not config or config.get("version", 0) <= self.dictionary_version:
+                return
+
+            points = {entry["word"]: entry["points"] for entry in config.get("words", [])}
+            # Construction hors de la boucle d'événements ; les messages utilisent l'ancien automate en attendant
+            matcher = await asyncio.to_thread(
+                GenanceMatcher, points, config.get("excluded", []), config.get("substitutions", LETTER_SUBSTITUTIONS)
+            )
+            self.matcher, self.points, self.dictionary_version = matcher, points, config["version"]
+            logging.info(f"Dictionnaire de gênance chargé (version {self.dictionary_version}, {len(points)} mot(s)).")
+
+    @tasks.loop(seconds=DICTIONARY_SYNC)
+    async def sync_dictionary(self):
+        """Vérifie si une autre instance a modifié le dictionnaire."""
         try:
-            self.client = MongoClient(self.mongo_uri)
-            self.db = self.client["discord_bot"]
-            self.collection = self.db["genance_data"]
-            logging.info("Connexion à MongoDB réussie.")
+            config = await self.config_collection.find_one({"_id": DICTIONARY_ID}, {"version": 1})
+            if config and config.get("version", 0) > self.dictionary_version:
+                await self.reload_dictionary()
         except Exception as e:
-            logging.error(f"Erreur lors de la connexion à MongoDB : {e}")
-            raise
-
-        # Précompilation des patterns pour les mots gênants
-        self.genance_patterns = {
-            word: re.compile(build_advanced_pattern(word), re.IGNORECASE)
-            for word in GENANCE_WORDS
-        }
-        # Précompilation des patterns pour les mots exclus
-        self.excluded_patterns = [
-            re.compile(rf"\b{re.escape(excluded)}\b", re.IGNORECASE)
-            for excluded in EXCLUDED_WORDS
-        ]
-
-    def get_user_data(self, user_id):
+            logging.error(f"Erreur lors de la synchronisation du dictionnaire de gênance : {e}")
+
+    async def update_dictionary(self, *updates):
+        """Applique au dictionnaire la première modification dont le filtre correspond, incrémente sa version
+        puis reconstruit l'automate. Retourne True si le document a changé."""
+        for query, update in updates:
+            update.setdefault("$inc", {})["version"] = 1
+            result = await self.config_collection.update_one({"_id": DICTIONARY_ID, **query}, update)
+            if result.modified_count:
+                await self.reload_dictionary()
+                return True
+        return False
+
+    async def get_user_data(self, user_id):
         """Récupère les données de gênance d'un utilisateur depuis MongoDB."""
         try:
-            user_data = self.collection.find_one({"user_id": user_id})
-            if not user_data:
-                user_data = {"user_id": user_id, "genance_points": 0}
-                self.collection.insert_one(user_data)
-                logging.info(f"Création de données de gênance pour l'utilisateur {user_id}.")
-            return user_data
+            user_data = await self.collection.find_one({"user_id": user_id})
+            return user_data or {"user_id": user_id, "genance_points": 0}
         except Exception as e:
             logging.error(f"Erreur lors de la récupération des données d'utilisateur : {e}")
             return {"user_id": user_id, "genance_points": 0}
 
-    def update_user_data(self, user_id, points, word):
-        """Mise à jour des points de gênance d'un utilisateur."""
+    async def update_user_data(self, user_id, points, word):
+        """Mise à jour des points de gênance d'un utilisateur (total et compteur du mot) en une écriture atomique."""
         try:
-            user_data = self.get_user_data(user_id)
-            new_points = user_data["genance_points"] + points
-            self.collection.update_one(
+            user_data = await self.collection.find_one_and_update(
                 {"user_id": user_id},
-                {"$set": {"genance_points": new_points}},
-                upsert=True
+                {"$inc": {"genance_points": points, f"words.{word}": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
             )
+            new_points = user_data["genance_points"]
             logging.info(f"Ajout de {points} points de gênance à l'utilisateur {user_id} pour le mot '{word}'. Total : {new_points}")
         except Exception as e:
             logging.error(f"Erreur lors de la mise à jour des points de gênance : {e}")
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """Ajoute des points de gênance lorsqu'un mot gênant est détecté."""
-        if message.author.bot:
-            return
+    async def handle_message(self, record):
+        """Ajoute des points de gênance lorsqu'un mot gênant est détecté (messages de bots filtrés par MessageIngest)."""
+        message = record.message
+        user_id = record.author_id
 
-        user_id = str(message.author.id)
-        content = message.content.lower()
+        # Recherche des mots gênants et des mots exclus en une seule passe
+        # (automate et barème lus ensemble, avant toute attente, pour rester cohérents)
+        matcher, points = self.matcher, self.points
+        result = matcher.scan_lowered(record.lowered)
 
         # Vérification des mots exclus
-        for excluded_pattern in self.excluded_patterns:
-            if excluded_pattern.search(content):
-                logging.info(f"Message ignoré car contient un mot exclu : '{message.content}'")
-                return
+        if result.excluded:
+            logging.info(f"Message ignoré car contient un mot exclu : '{message.content}'")
+            return
 
-        # Vérification des mots gênants
-        for word, pattern in self.genance_patterns.items():
-            if pattern.search(content):
-                self.update_user_data(user_id, GENANCE_WORDS[word], word)
-                response = f"😬 {message.author.mention}, +{GENANCE_WORDS[word]} point(s) de gênance pour avoir dit **{word}** !"
-                # Vérifier si le bot a la permission de répondre dans le salon
-                if message.channel.permissions_for(message.guild.me).send_messages:
-                    if message.channel.permissions_for(message.guild.me).mention_everyone:
-                        await message.reply(response)  # Réponse avec mention du message d'origine
-                    else:
-                        await message.channel.send(response)  # Envoie normalement si pas de reply possible
-                else:
-                    # Répondre via un message privé (éphemeral) si le bot n'a pas la permission
-                    await message.author.send(response)
-                    logging.info(f"Mot gênant détecté : '{word}' (ou une variante) dans le message : '{message.content}'")
-                break  # Arrêter après le premier mot gênant détecté
+        # Seul le premier mot gênant détecté (par ordre de priorité de la liste) est compté
+        if not result.words:
+            return
+        word = result.words[0]
+        await self.update_user_data(user_id, points[word], word)
+        response = f"😬 {message.author.mention}, +{points[word]} point(s) de gênance pour avoir dit **{word}** !"
+        # Vérifier si le bot a la permission de répondre dans le salon
+        if message.channel.permissions_for(message.guild.me).send_messages:
+            if message.channel.permissions_for(message.guild.me).mention_everyone:
+                await message.reply(response)  # Réponse avec mention du message d'origine
+            else:
+                await message.channel.send(response)  # Envoie normalement si pas de reply possible
+        else:
+            # Répondre via un message privé (éphemeral) si le bot n'a pas la permission
+            await message.author.send(response)
+            logging.info(f"Mot gênant détecté : '{word}' (ou une variante) dans le message : '{message.content}'")
 
     @app_commands.command(name="genance", description="Consulte les points de gênance d'un utilisateur.")
     async def genance(self, interaction: discord.Interaction, member: discord.Member = None):
         """Affiche les points de gênance d'un utilisateur via une commande slash."""
         member = member or interaction.user
         user_id = str(member.id)
-        user_data = self.get_user_data(user_id)
+        user_data = await self.get_user_data(user_id)
         points = user_data["genance_points"]
+        # Détail des mots les plus souvent dits
+        words = sorted(user_data.get("words", {}).items(), key=lambda item: item[1], reverse=True)[:5]
+        details = "\n".join(f"- **{word}** : {count} fois" for word, count in words)
         await interaction.response.send_message(
-            f"😬 {member.mention} a accumulé **{points}** point(s) de gênance.",
+            f"😬 {member.mention} a accumulé **{points}** point(s) de gênance."
+            + (f"\n{details}" if details else ""),
             ephemeral=True  # Message visible uniquement par l'utilisateur qui a exécuté la commande
         )
 
+    async def get_top(self):
+        """Retourne les utilisateurs les plus gênants, lus via l'index et gardés en cache quelques secondes."""
+        expires, entries = self.top_cache
+        if time.monotonic() < expires:
+            return entries
+        entries = await self.collection.find(
+            {}, {"_id": 0, "user_id": 1, "genance_points": 1},
+            sort=[("genance_points", DESCENDING)],
+            limit=TOP["size"]
+        )
+        self.top_cache = (time.monotonic() + TOP["ttl"], entries)
+        return entries
+
+    @app_commands.command(name="genance-top", description="Affiche les utilisateurs les plus gênants.")
+    async def genance_top(self, interaction: discord.Interaction):
+        """Affiche le classement des points de gênance."""
+        try:
+            entries = await self.get_top()
+            if not entries:
+                await interaction.response.send_message("Personne n'a encore de points de gênance.", ephemeral=True)
+                return
+            lines = [
+                f"**#{rank}** <@{entry['user_id']}> : **{entry['genance_points']}** point(s)"
+                for rank, entry in enumerate(entries, start=1)
+            ]
+            await interaction.response.send_message(
+                "😬 **Classement de la gênance**\n" + "\n".join(lines),
+                allowed_mentions=discord.AllowedMentions.none()
+            )
+        except Exception as e:
+            logging.error(f"Erreur lors du traitement de la commande /genance-top : {e}")
+            await interaction.response.send_message("Une erreur est survenue lors de l'affichage du classement.", ephemeral=True)
+
+    @app_commands.command(name="genance-word-set", description="Ajoute un mot gênant ou modifie ses points.")
+    @app_commands.describe(word="Le mot gênant.", points="Points de gênance attribués.")
+    @require_command_role("genance-word-set")
+    async def genance_word_set(self, interaction: discord.Interaction, word: str, points: app_commands.Range[int, 1]):
+        """Ajoute un mot gênant au dictionnaire ou modifie ses points."""
+        word = word.strip().lower()
+        # Le mot sert de clé dans le détail des compteurs (champ words.<mot>) : "." et "$" y sont interdits
+        if not word or "." in word or word.startswith("$"):
+            await interaction.response.send_message("⚠️ Ce mot ne peut pas être utilisé.", ephemeral=True)
+            return
+        try:
+            await interaction.response.defer(ephemeral=True)
+            await self.update_dictionary(
+                ({"words": {"$elemMatch": {"word": word, "points": {"$ne": points}}}}, {"$set": {"words.$.points": points}}),
+                ({"words.word": {"$ne": word}}, {"$push": {"words": {"word": word, "points": points}}}),
+            )
+            await interaction.followup.send(f"✅ Le mot **{word}** rapporte maintenant {points} point(s) de gênance.")
+        except Exception as e:
+            logging.error(f"Erreur lors de la modification du mot gênant '{word}' : {e}")
+            await interaction.followup.send("Une erreur est survenue lors de la modification du dictionnaire.")
+
+    @app_commands.command(name="genance-word-remove", description="Retire un mot gênant du dictionnaire.")
+    @app_commands.describe(word="Le mot gênant à retirer.")
+    @require_command_role("genance-word-remove")
+    async def genance_word_remove(self, interaction: discord.Interaction, word: str):
+        """Retire un mot gênant du dictionnaire."""
+        word = word.strip().lower()
+        try:
+            await interaction.response.defer(ephemeral=True)
+            if await self.update_dictionary(({"words.word": word}, {"$pull": {"words": {"word": word}}})):
+                await interaction.followup.send(f"✅ Le mot **{word}** a été retiré du dictionnaire.")
+            else:
+                await interaction.followup.send(f"⚠️ Le mot **{word}** n'est pas dans le dictionnaire.")
+        except Exception as e:
+            logging.error(f"Erreur lors du retrait du mot gênant '{word}' : {e}")
+            await interaction.followup.send("Une erreur est survenue lors de la modification du dictionnaire.")
+
+    @app_commands.command(name="genance-exclude-add", description="Ajoute un mot exclu (un message le contenant est ignoré).")
+    @app_commands.describe(word="Le mot à exclure.")
+    @require_command_role("genance-exclude-add")
+    async def genance_exclude_add(self, interaction: discord.Interaction, word: str):
+        """Ajoute un mot à la liste des mots exclus."""
+        word = word.strip().lower()
+        try:
+            await interaction.response.defer(ephemeral=True)
+            if await self.update_dictionary(({"excluded": {"$ne": word}}, {"$push": {"excluded": word}})):
+                await interaction.followup.send(f"✅ Le mot **{word}** est maintenant exclu.")
+            else:
+                await interaction.followup.send(f"⚠️ Le mot **{word}** est déjà exclu.")
+        except Exception as e:
+            logging.error(f"Erreur lors de l'ajout du mot exclu '{word}' : {e}")
+            await interaction.followup.send("Une erreur est survenue lors de la modification du dictionnaire.")
+
+    @app_commands.command(name="genance-exclude-remove", description="Retire un mot de la liste des mots exclus.")
+    @app_commands.describe(word="Le mot à ne plus exclure.")
+    @require_command_role("genance-exclude-remove")
+    async def genance_exclude_remove(self, interaction: discord.Interaction, word: str):
+        """Retire un mot de la liste des mots exclus."""
+        word = word.strip().lower()
+        try:
+            await interaction.response.defer(ephemeral=True)
+            if await self.update_dictionary(({"excluded": word}, {"$pull": {"excluded": word}})):
+                await interaction.followup.send(f"✅ Le mot **{word}** n'est plus exclu.")
+            else:
+                await interaction.followup.send(f"⚠️ Le mot **{word}** n'était pas exclu.")
+        except Exception as e:
+            logging.error(f"Erreur lors du retrait du mot exclu '{word}' : {e}")
+            await interaction.followup.send("Une erreur est survenue lors de la modification du dictionnaire.")
+
 async def setup(bot):
     await bot.add_cog(GenanceSystem(bot))
@@ -0,0 +1,98 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+from collections import namedtuple
+import logging
+import time
+from metrics import MESSAGE_STAGE_LATENCY
+from permissions import require_command_role
+
+# Configuration des logs
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Message préparé une seule fois et transmis à tous les consommateurs (lecture seule)
+IngestedMessage = namedtuple("IngestedMessage", [
+    "message",     # discord.Message d'origine
+    "author_id",   # ID de l'auteur, en chaîne comme dans MongoDB
+    "channel_id",
+    "guild_id",
+    "is_bot",      # Message envoyé par un bot
+    "ignored",     # Salon ignoré pour les gains d'XP
+    "lowered",     # Contenu en minuscules
+])
+
+# Consommateur enregistré : fonction appelée et filtres appliqués avant l'appel
+Consumer = namedtuple("Consumer", ["callback", "skip_bots", "skip_ignored"])
+
+class MessageIngest(commands.Cog):
+    """Point d'entrée unique des messages : prépare chaque message une fois puis le distribue aux consommateurs."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.consumers = {}  # nom -> Consumer
+        self.timings = {}    # étape -> [nombre d'appels, durée totale en secondes, durée maximale]
+
+    def register(self, name, callback, skip_bots=True, skip_ignored=False):
+        """Enregistre une coroutine appelée avec un IngestedMessage pour chaque message reçu."""
+        self.consumers[name] = Consumer(callback, skip_bots, skip_ignored)
+        logging.info(f"Consommateur de messages enregistré : {name}.")
+
+    def unregister(self, name):
+        self.consumers.pop(name, None)
+
+    def record_timing(self, stage, duration):
+        timing = self.timings.setdefault(stage, [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += duration
+        timing[2] = max(timing[2], duration)
+        MESSAGE_STAGE_LATENCY.observe(duration, stage)
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        """Prépare le message puis l'envoie aux consommateurs enregistrés."""
+        started = time.perf_counter()
+        # Salons ignorés publiés par XPSystem (ensemble en mémoire)
+        ignored_channels = getattr(self.bot, "ignored_channels", ())
+        record = IngestedMessage(
+            message=message,
+            author_id=str(message.author.id),
+            channel_id=message.channel.id,
+            guild_id=message.guild.id if message.guild else None,
+            is_bot=message.author.bot,
+            ignored=message.channel.id in ignored_channels,
+            lowered=message.content.lower(),
+        )
+        self.record_timing("normalize", time.perf_counter() - started)
+
+        for name, consumer in list(self.consumers.items()):
+            if (consumer.skip_bots and record.is_bot) or (consumer.skip_ignored and record.ignored):
+                continue
+            stage_started = time.perf_counter()
+            try:
+                await consumer.callback(record)
+            except Exception as e:
+                logging.error(f"Erreur dans le consommateur de messages {name} : {e}")
+            finally:
+                self.record_timing(name, time.perf_counter() - stage_started)
+
+    def stats(self):
+        """Nombre d'appels, durée moyenne et maximale (ms) de chaque étape."""
+        return {
+            stage: {"calls": calls, "avg_ms": total / calls * 1000, "max_ms": maximum * 1000}
+            for stage, (calls, total, maximum) in self.timings.items()
+        }
+
+    @app_commands.command(name="ingest-stats", description="Affiche le temps passé dans chaque étape du traitement des messages.")
+    @require_command_role("ingest-stats")
+    async def ingest_stats(self, interaction: discord.Interaction):
+        """Affiche les statistiques de traitement des messages."""
+        lines = [
+            f"- `{stage}` : {stats['calls']} appel(s), {stats['avg_ms']:.2f} ms en moyenne, {stats['max_ms']:.2f} ms max"
+            for stage, stats in self.stats().items()
+        ]
+        await interaction.response.send_message(
+            "📨 **Traitement des messages**\n" + ("\n".join(lines) or "Aucun message traité."), ephemeral=True
+        )
+
+async def setup(bot):
+    await bot.add_cog(MessageIngest(bot))
@@ -1,8 +1,6 @@
 import discord
 from discord.ext import tasks, commands
 from discord import app_commands
-from pymongo import MongoClient  # type: ignore
-import os
 import logging
 import asyncio
 
@@ -17,33 +15,23 @@ class BotStatusManager(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
-        # Connexion à MongoDB
-        self.mongo_uri = os.getenv("MONGO_URI")
-        if not self.mongo_uri:
-            logging.error("Erreur : URI MongoDB non configurée dans les variables d'environnement.")
-            raise ValueError("La variable d'environnement MONGO_URI est obligatoire.")
-        
-        try:
-            self.client = MongoClient(self.mongo_uri)
-            self.db = self.client["discord_bot"]
-            self.collection = self.db["bot_status"]
-            logging.info("Connexion à MongoDB réussie.")
-        except Exception as e:
-            logging.error(f"Erreur lors de la connexion à MongoDB : {e}")
-            raise
+        # Client MongoDB partagé, créé et fermé par le bot
+        self.storage = bot.storage
+        self.collection = self.storage["bot_status"]
 
+    async def cog_load(self):
         # Chargement des données depuis la base
-        self.load_status_data()
+        await self.load_status_data()
 
         # Lancement du cycler si nécessaire
         self.activity_cycler.start()
 
-    def cog_unload(self):
+    async def cog_unload(self):
         self.activity_cycler.cancel()
 
-    def load_status_data(self):
+    async def load_status_data(self):
         """Charge les informations de statut et d'activités depuis la base de données."""
-        data = self.collection.find_one({"bot_id": "status_data"})
+        data = await self.collection.find_one({"bot_id": "status_data"})
         if data:
             self.activity_cycle = [discord.Activity(type=discord.ActivityType[data["type"]], name=activity)
                                    for activity in data.get("activities", [])]
@@ -60,11 +48,11 @@ class BotStatusManager(commands.Cog):
             self.current_activity = None
             logging.info("Aucune donnée de statut trouvée. Configuration par défaut appliquée.")
 
-    def save_status_data(self):
+    async def save_status_data(self):
         """Enregistre les informations de statut et d'activités dans la base de données."""
         try:
             activities = [activity.name for activity in self.activity_cycle]
-            self.collection.update_one(
+            await self.collection.update_one(
                 {"bot_id": "status_data"},
                 {
                     "$set": {
@@ -159,7 +147,7 @@ class BotStatusManager(commands.Cog):
             return
 
         # Sauvegarde dans MongoDB
-        self.save_status_data()
+        await self.save_status_data()
 
         # Réactivation du cycler si nécessaire
         if self.activity_cycle:
@@ -213,7 +201,7 @@ class BotStatusManager(commands.Cog):
         # Mettre à jour le cycle si des activités valides sont définies
         if self.activity_cycle:
             self.activity_cycler.change_interval(seconds=self.cycle_interval)
-            self.save_status_data()
+            await self.save_status_data()
             await interaction.response.send_message(
                 f"✅ Cycle d'activités défini avec un intervalle de {interval} secondes : {', '.join(activity_list)}."
             )
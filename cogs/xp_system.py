@@ -3,83 +3,408 @@ from discord import app_commands, Role
 from discord.ext import commands, tasks
 import random
 import logging
-import os
 import asyncio
-from pymongo import MongoClient # type: ignore
-from datetime import datetime, timedelta
+import time
 import math
+from pymongo import DESCENDING, ReturnDocument, UpdateOne # type: ignore
+from pymongo.errors import BulkWriteError # type: ignore
+from levels import LevelCurve
+from permissions import require_command_role
 
 # Configuration des logs
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# ID de l'utilisateur autorisé à lancer les tâches de maintenance
+OWNER_ID = 463639826361614336
+
 # Définition des limites d'XP/LVL pour chaque type d'interaction
 XP_LIMITS = {
     "message": {"min": 5, "max": 15},   # XP pour les messages
     "vocal": {"min": 8, "max": 16},     # XP pour les salons vocaux
     "reaction": {"min": 2, "max": 8},   # XP pour les réactions
-    "levels": {"multiplicator": 0.30},  # Multiplicateur pour lvl-up
+    "levels": {"multiplicator": 0.30},  # Multiplicateur pour lvl-up (ou "thresholds" : table explicite des seuils)
+}
+
+# Table des seuils de niveaux, précalculée une fois à partir de XP_LIMITS["levels"]
+LEVEL_CURVE = LevelCurve.from_config(XP_LIMITS["levels"])
+
+# Paramètres du tampon d'écriture de l'XP
+XP_FLUSH = {
+    "interval": 30,       # Secondes entre deux écritures groupées
+    "max_pending": 500,   # Nombre d'utilisateurs en attente déclenchant une écriture immédiate
+    "max_cached": 50000,  # Nombre de totaux d'XP gardés en mémoire avant nettoyage
+}
+
+# Intervalle de resynchronisation des caches (salons ignorés, rôles de commandes) avec MongoDB
+CACHE_REFRESH = 300
+
+# Anti-abus : délai entre deux gains par message, et suivi des réactions déjà récompensées
+COOLDOWNS = {
+    "message": 60,                # Secondes entre deux gains d'XP par message
+    "reaction_ttl": 86400,        # Durée de suivi d'une réaction récompensée
+    "reaction_max": 100000,       # Nombre maximum de réactions suivies
+}
+
+# Paramètres de l'XP vocale
+VOICE = {
+    "minute": 60,        # Durée (secondes) donnant droit à un gain d'XP vocale
+    "checkpoint": 300,   # Secondes entre deux crédits groupés des sessions en cours
+    "session_ttl": 900,  # Durée de vie d'une session sans point de contrôle (processus arrêté sans fermeture)
 }
 
+# Paramètres du classement
+LEADERBOARD = {
+    "page_size": 10,     # Nombre d'utilisateurs par page
+    "cached_pages": 5,   # Nombre de premières pages gardées en cache
+    "refresh": 60,       # Secondes entre deux rafraîchissements du cache
+}
+
+# Paramètres du recalcul des niveaux
+LEVEL_JOB = {
+    "name": "recompute_levels",  # Identifiant du point de contrôle dans la collection jobs
+    "batch_size": 5000,          # Documents lus et recalculés par lot
+    "progress_interval": 2,      # Secondes minimum entre deux rapports de progression
+}
+
+class XPAccumulator:
+    """Cumule les gains d'XP en mémoire et les écrit en un seul bulk_write de $inc."""
+
+    def __init__(self, collection, max_pending, max_cached):
+        self.collection = collection
+        self.max_pending = max_pending
+        self.max_cached = max_cached
+        self.pending = {}  # user_id -> XP gagnée pas encore écrite
+        self.totals = {}   # user_id -> XP totale connue (base + en attente)
+        self.lock = asyncio.Lock()
+
+    def needs_flush(self):
+        return len(self.pending) >= self.max_pending
+
+    async def get_total(self, user_id):
+        """Retourne l'XP totale d'un utilisateur, en ne lisant MongoDB qu'au premier accès."""
+        if user_id not in self.totals:
+            # Lecture et création éventuelle en un seul aller-retour atomique
+            user_data = await self.collection.find_one_and_update(
+                {"user_id": user_id},
+                {"$setOnInsert": {"xp": 0, "level": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            # Un autre gain a pu initialiser le total pendant la lecture
+            self.totals.setdefault(user_id, user_data["xp"])
+        return self.totals[user_id]
+
+    def add(self, user_id, xp_amount):
+        """Ajoute un gain au tampon et retourne la nouvelle XP totale."""
+        self.pending[user_id] = self.pending.get(user_id, 0) + xp_amount
+        self.totals[user_id] += xp_amount
+        return self.totals[user_id]
+
+    async def apply_now(self, user_id, xp_amount, calculate_level):
+        """Applique immédiatement un gain via un $inc atomique et retourne la nouvelle XP totale."""
+        # Attend la fin d'une écriture groupée en cours : ses gains ne sont plus dans `pending`
+        # mais pas encore dans le document lu
+        async with self.lock:
+            user_data = await self.collection.find_one_and_update(
+                {"user_id": user_id},
+                {"$inc": {"xp": xp_amount}, "$setOnInsert": {"level": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            # Le niveau n'est réécrit que s'il change, et seulement si l'XP n'a pas bougé entre-temps
+            new_level = calculate_level(user_data["xp"])
+            if new_level != user_data.get("level"):
+                await self.collection.update_one(
+                    {"user_id": user_id, "xp": user_data["xp"]},
+                    {"$set": {"level": new_level}}
+                )
+            # Un total déjà connu est décalé du gain plutôt que remplacé par la lecture
+            if user_id in self.totals:
+                self.totals[user_id] += xp_amount
+            else:
+                self.totals[user_id] = user_data["xp"] + self.pending.get(user_id, 0)
+            return self.totals[user_id]
+
+    async def flush(self, calculate_level):
+        """Écrit tous les gains en attente en une seule opération groupée non ordonnée."""
+        async with self.lock:
+            if not self.pending:
+                return 0
+            pending, self.pending = self.pending, {}
+            user_ids = list(pending)
+            operations = [
+                UpdateOne({"user_id": user_id}, {"$inc": {"xp": pending[user_id]}, "$setOnInsert": {"level": 1}}, upsert=True)
+                for user_id in user_ids
+            ]
+            written = user_ids
+            try:
+                await self.collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # Seules les opérations en erreur sont remises en attente
+                failed = {user_ids[error["index"]] for error in e.details.get("writeErrors", [])}
+                self.requeue({user_id: pending[user_id] for user_id in failed})
+                logging.error(f"Erreur lors de l'écriture groupée de l'XP ({len(failed)} échec(s)) : {e}")
+                written = [user_id for user_id in user_ids if user_id not in failed]
+            except Exception as e:
+                self.requeue(pending)
+                logging.error(f"Erreur lors de l'écriture groupée de l'XP : {e}")
+                return 0
+
+            await self.sync_levels(written, calculate_level)
+
+            # Nettoyage des totaux sans gain en attente si le cache devient trop grand
+            if len(self.totals) > self.max_cached:
+                self.totals = {user_id: xp for user_id, xp in self.totals.items() if user_id in self.pending}
+            return len(written)
+
+    async def sync_levels(self, user_ids, calculate_level):
+        """Relit les documents écrits pour calculer le niveau sur l'XP réelle et resynchroniser les totaux.
+
+        Dans un cluster, d'autres processus incrémentent les mêmes documents : le total en mémoire
+        n'en est qu'une partie, le niveau ne peut donc être calculé qu'à partir du document à jour.
+        """
+        if not user_ids:
+            return
+        try:
+            documents = await self.collection.find(
+                {"user_id": {"$in": user_ids}}, {"user_id": 1, "xp": 1, "level": 1}
+            )
+            operations = []
+            for document in documents:
+                user_id, xp = document["user_id"], document.get("xp", 0)
+                # Total connu = XP écrite (tous processus confondus) + gains arrivés depuis le début de l'écriture
+                self.totals[user_id] = xp + self.pending.get(user_id, 0)
+                level = calculate_level(xp)
+                if level != document.get("level"):
+                    # Le filtre sur l'XP évite d'écraser un niveau si l'XP a changé entre-temps
+                    operations.append(UpdateOne({"_id": document["_id"], "xp": xp}, {"$set": {"level": level}}))
+            if operations:
+                await self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logging.error(f"Erreur lors de la mise à jour des niveaux après l'écriture groupée de l'XP : {e}")
+
+    def apply_external(self, deltas):
+        """Répercute sur les totaux en mémoire des gains écrits directement dans MongoDB."""
+        for user_id, xp_amount in deltas.items():
+            if user_id in self.totals:
+                self.totals[user_id] += xp_amount
+
+    def requeue(self, deltas):
+        for user_id, xp_amount in deltas.items():
+            self.pending[user_id] = self.pending.get(user_id, 0) + xp_amount
+
 class XPSystem(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
-        # Utilisation d'une variable d'environnement pour sécuriser l'URI MongoDB
-        self.mongo_uri = os.getenv("MONGO_URI")
-        if not self.mongo_uri:
-            logging.error("Erreur : URI MongoDB non configurée dans les variables d'environnement.")
-            raise ValueError("La variable d'environnement MONGO_URI est obligatoire.")
+        # Client MongoDB partagé, créé et fermé par le bot
+        self.storage = bot.storage
+        self.collection = self.storage["xp_data"]
         
+        # Tampon des gains d'XP, écrit périodiquement dans MongoDB
+        self.xp_buffer = XPAccumulator(self.collection, XP_FLUSH["max_pending"], XP_FLUSH["max_cached"])
+
+        # Salons ignorés gardés en mémoire pour éviter une requête par événement
+        self.ignored_channels = set()
+        # Rôles autorisés par commande, chargés par le bot et partagés avec les autres cogs
+        self.permissions = bot.permission_resolver
+
+        # Premières pages du classement, rafraîchies en arrière-plan
+        self.leaderboard_cache = []
+        self.leaderboard_total = 0
+
+        # Sessions vocales gérées par ce processus : user_id -> début de la période pas encore créditée (time.time)
+        self.voice_sessions = {}
+        # État anti-abus, en mémoire ou partagé entre processus selon le backend du bot
+        self.last_message_xp = bot.state.namespace("message_cooldown", COOLDOWNS["message"])
+        self.reaction_tracking = bot.state.namespace(
+            "reaction", COOLDOWNS["reaction_ttl"], max_size=COOLDOWNS["reaction_max"]
+        )
+        # Sessions vocales réservées dans l'état partagé : un seul processus crédite un utilisateur donné
+        # (libérées dès la fin de session : les refus ne sont pas mis en cache)
+        self.voice_state = bot.state.namespace("voice_session", VOICE["session_ttl"], early_release=True)
+
+        # Empêche deux recalculs de niveaux simultanés
+        self.level_job_lock = asyncio.Lock()
+
+    async def cog_load(self):
+        await self.load_ignored_channels()
+        # Salons ignorés partagés avec le point d'entrée des messages
+        self.bot.ignored_channels = self.ignored_channels
+        ingest = self.bot.get_cog("MessageIngest")
+        if ingest:
+            ingest.register("xp", self.handle_message, skip_ignored=True)
+        else:
+            logging.warning("MessageIngest n'est pas chargé : aucun gain d'XP par message.")
+        self.refresh_caches.start()
+        self.flush_xp.start()
+        self.refresh_leaderboard.start()
+        self.voice_checkpoint.start()
+
+    async def cog_unload(self):
+        ingest = self.bot.get_cog("MessageIngest")
+        if ingest:
+            ingest.unregister("xp")
+        self.voice_checkpoint.cancel()
+        # Les sessions vocales en cours sont créditées avant l'écriture finale
+        for user_id in list(self.voice_sessions):
+            await self.end_voice_session(user_id)
+        self.refresh_caches.cancel()
+        self.refresh_leaderboard.cancel()
+        self.flush_xp.cancel()
+        # Dernière écriture des gains en attente avant la fermeture (déchargement ou arrêt du bot)
+        await self.xp_buffer.flush(self.calculate_level)
+
+    @tasks.loop(seconds=XP_FLUSH["interval"])
+    async def flush_xp(self):
+        """Écrit périodiquement les gains d'XP accumulés."""
+        written = await self.xp_buffer.flush(self.calculate_level)
+        if written:
+            logging.debug(f"{written} utilisateur(s) mis à jour lors de l'écriture groupée de l'XP.")
+
+    async def load_ignored_channels(self):
+        """Charge la liste des salons ignorés depuis MongoDB."""
         try:
-            self.client = MongoClient(self.mongo_uri)
-            self.db = self.client["discord_bot"]
-            self.collection = self.db["xp_data"]
-            logging.info("Connexion à MongoDB réussie.")
+            documents = await self.storage["ignored_channels"].find({}, {"channel_id": 1})
+            # Mise à jour en place : l'ensemble est partagé avec MessageIngest via le bot
+            channel_ids = {document["channel_id"] for document in documents}
+            self.ignored_channels.clear()
+            self.ignored_channels.update(channel_ids)
+            logging.debug(f"{len(self.ignored_channels)} salon(s) ignoré(s) chargé(s).")
         except Exception as e:
-            logging.error(f"Erreur lors de la connexion à MongoDB : {e}")
-            raise
-        
-        # Dictionnaire pour suivre les timers des salons vocaux
-        self.vocal_timers = {}
-        # Dictionnaire pour limiter les gains d'XP par message ou réaction
-        self.last_message_xp = {}
-        self.reaction_tracking = {}
-
-    def get_user_data(self, user_id):
-        """Récupère les données d'XP et de niveau d'un utilisateur depuis MongoDB."""
+            logging.error(f"Erreur lors du chargement des salons ignorés : {e}")
+
+    @tasks.loop(seconds=CACHE_REFRESH)
+    async def refresh_caches(self):
+        """Resynchronise périodiquement les caches (modifications faites par une autre instance)."""
+        # Le premier tour est immédiat alors que les caches viennent d'être chargés par cog_load
+        if self.refresh_caches.current_loop == 0:
+            return
+        await self.load_ignored_channels()
+        await self.permissions.load()
+
+    @tasks.loop(seconds=LEADERBOARD["refresh"])
+    async def refresh_leaderboard(self):
+        """Rafraîchit le cache des premières pages du classement à partir de l'index sur l'XP."""
         try:
-            user_data = self.collection.find_one({"user_id": user_id})
-            if not user_data:
-                user_data = {"user_id": user_id, "xp": 0, "level": 1}
-                self.collection.insert_one(user_data)
-                logging.info(f"Création de données pour l'utilisateur {user_id}.")
-            return user_data
+            # Les gains en attente sont écrits pour que le classement soit à jour
+            await self.xp_buffer.flush(self.calculate_level)
+            self.leaderboard_cache = await self.collection.find(
+                {}, {"_id": 0, "user_id": 1, "xp": 1},
+                sort=[("xp", DESCENDING)],
+                limit=LEADERBOARD["page_size"] * LEADERBOARD["cached_pages"]
+            )
+            self.leaderboard_total = await self.collection.estimated_document_count()
+        except Exception as e:
+            logging.error(f"Erreur lors du rafraîchissement du classement : {e}")
+
+    async def get_leaderboard_page(self, page):
+        """Retourne les utilisateurs d'une page du classement (depuis le cache pour les premières pages)."""
+        start = (page - 1) * LEADERBOARD["page_size"]
+        if page <= LEADERBOARD["cached_pages"]:
+            return self.leaderboard_cache[start:start + LEADERBOARD["page_size"]]
+        return await self.collection.find(
+            {}, {"_id": 0, "user_id": 1, "xp": 1},
+            sort=[("xp", DESCENDING)],
+            skip=start,
+            limit=LEADERBOARD["page_size"]
+        )
+
+    async def get_rank(self, xp):
+        """Calcule le rang d'un utilisateur en comptant, via l'index, ceux qui ont plus d'XP."""
+        return await self.collection.count_documents({"xp": {"$gt": xp}}) + 1
+
+    async def recompute_levels(self, progress=None):
+        """Recalcule les niveaux stockés de toute la collection, par lots, en reprenant au dernier point de contrôle.
+
+        Seuls les documents dont le niveau change sont réécrits. `progress` est appelée après chaque lot
+        avec (documents parcourus, documents modifiés).
+        """
+        jobs = self.storage["jobs"]
+        signature = LEVEL_CURVE.signature()
+        last_id, scanned, updated = None, 0, 0
+
+        # Reprise uniquement si le recalcul interrompu concernait la même courbe
+        checkpoint = await jobs.find_one({"job": LEVEL_JOB["name"]})
+        if checkpoint and checkpoint.get("curve") == signature and not checkpoint.get("done"):
+            last_id = checkpoint.get("last_id")
+            scanned = checkpoint.get("scanned", 0)
+            updated = checkpoint.get("updated", 0)
+            logging.info(f"Reprise du recalcul des niveaux après {scanned} document(s).")
+
+        # Les gains en attente sont écrits pour que les niveaux soient calculés sur l'XP à jour
+        await self.xp_buffer.flush(self.calculate_level)
+
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            batch = await self.collection.find(
+                query, {"xp": 1, "level": 1}, sort=[("_id", 1)], limit=LEVEL_JOB["batch_size"]
+            )
+            if not batch:
+                break
+
+            levels = LEVEL_CURVE.levels_for(document.get("xp", 0) for document in batch)
+            operations = [
+                # Le filtre sur l'XP évite d'écraser un niveau si l'XP a changé entre-temps
+                UpdateOne({"_id": document["_id"], "xp": document.get("xp")}, {"$set": {"level": level}})
+                for document, level in zip(batch, levels)
+                if document.get("level") != level
+            ]
+            if operations:
+                result = await self.collection.bulk_write(operations, ordered=False)
+                updated += result.modified_count
+
+            last_id = batch[-1]["_id"]
+            scanned += len(batch)
+            await jobs.update_one(
+                {"job": LEVEL_JOB["name"]},
+                {"$set": {"curve": signature, "last_id": last_id, "scanned": scanned, "updated": updated, "done": False}},
+                upsert=True
+            )
+            if progress:
+                await progress(scanned, updated)
+
+        await jobs.update_one({"job": LEVEL_JOB["name"]}, {"$set": {"done": True}}, upsert=True)
+        return scanned, updated
+
+    def cache_stats(self):
+        """Tailles des caches en mémoire du système d'XP."""
+        return {
+            "last_message_xp": self.last_message_xp.stats(),
+            "reaction_tracking": self.reaction_tracking.stats(),
+            "xp_totals": {"size": len(self.xp_buffer.totals)},
+            "xp_pending": {"size": len(self.xp_buffer.pending)},
+            "voice_sessions": {"size": len(self.voice_sessions)},
+            "voice_state": self.voice_state.stats(),
+            "ignored_channels": {"size": len(self.ignored_channels)},
+        }
+
+    async def get_user_data(self, user_id):
+        """Récupère les données d'XP et de niveau d'un utilisateur (gains en attente inclus)."""
+        try:
+            xp = await self.xp_buffer.get_total(user_id)
+            return {"user_id": user_id, "xp": xp, "level": self.calculate_level(xp)}
         except Exception as e:
             logging.error(f"Erreur lors de la récupération des données d'utilisateur : {e}")
             return {"user_id": user_id, "xp": 0, "level": 1}
 
-    def update_user_data(self, user_id, xp_amount, source):
+    async def update_user_data(self, user_id, xp_amount, source, immediate=False):
         """Mise à jour des données d'XP et de niveau d'un utilisateur."""
         try:
-            user_data = self.get_user_data(user_id)
-            logging.debug(f"Données utilisateur récupérées : {user_data}") # Debug récupération de données
-            old_level = user_data["level"]
-            new_xp = user_data["xp"] + xp_amount
+            if immediate:
+                # Modification manuelle : écriture atomique immédiate, sans passer par le tampon
+                new_xp = await self.xp_buffer.apply_now(user_id, xp_amount, self.calculate_level)
+                old_level = self.calculate_level(new_xp - xp_amount)
+            else:
+                old_xp = await self.xp_buffer.get_total(user_id)
+                old_level = self.calculate_level(old_xp)
+                # Le gain est mis en tampon, l'écriture dans MongoDB est groupée
+                new_xp = self.xp_buffer.add(user_id, xp_amount)
             new_level = self.calculate_level(new_xp)
             logging.debug(f"XP actuel : {new_xp}, Nouveau niveau calculé : {new_level}") # Debug calcul niveau
 
-            """Vérification si l'utilisateur possède les données"""
-            if not user_data:
-                user_data = {"xp": 0, "level": 0}  # Valeurs par défaut si l'utilisateur n'existe pas
-
-            # Mise à jour des données d'XP et de niveau
-            result = self.collection.update_one(
-                {"user_id": user_id},
-                {"$set": {"xp": new_xp, "level": new_level}},
-                upsert=True
-            )
-            if result.modified_count == 0 and result.upserted_id is None:
-                logging.warning(f"La mise à jour pour l'utilisateur {user_id} n'a pas été effectuée.")
+            if self.xp_buffer.needs_flush():
+                await self.xp_buffer.flush(self.calculate_level)
 
             # Vérification si l'utilisateur a monté de niveau
             if new_level > old_level:
@@ -103,52 +428,22 @@ class XPSystem(commands.Cog):
 
     def calculate_level(self, xp):
         """Calcule le niveau d'un utilisateur en fonction de son XP."""
-        # Exemple ajusté : augmenter le taux en utilisant un exposant légèrement inférieur à 0.5
-        level = math.floor(xp ** XP_LIMITS["levels"]["multiplicator"])  # Ajuster ici le diviseur et l'exposant
-        return level
+        return LEVEL_CURVE.level_for(xp)
 
     def is_channel_ignored(self, channel_id):
         """Vérifie si un salon est ignoré pour les gains d'XP."""
-        ignored_channel = self.db["ignored_channels"].find_one({"channel_id": channel_id})
-        return ignored_channel is not None
+        return channel_id in self.ignored_channels
 
-    def has_command_permission(self, command_name, user):
-        """Vérifie si l'utilisateur a la permission d'utiliser une commande."""
-        try:
-            # Exceptions pour certaines commandes accessibles à tous
-            if command_name in ["xp"]:
-                return True
-            
-            # Récupérer les rôles configurés pour la commande
-            command_roles = self.db["command_roles"].find_one({"command": command_name})
-            
-            # Si aucun rôle n'est configuré, bloquer l'accès
-            if not command_roles or "roles" not in command_roles:
-                return False  # Bloqué par défaut
-            
-            # Vérifie si l'utilisateur a l'un des rôles autorisés
-            user_roles = [role.id for role in user.roles]
-            return any(role in user_roles for role in command_roles["roles"])
-        except Exception as e:
-            logging.error(f"Erreur lors de la vérification des permissions pour la commande {command_name} : {e}")
-            return False
+    async def handle_message(self, record):
+        """Ajoute de l'XP lorsqu'un utilisateur envoie un message (bots et salons ignorés filtrés par MessageIngest)."""
+        user_id = record.author_id
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """Ajoute de l'XP lorsqu'un utilisateur envoie un message(si le salon n'est pas ignoré)."""
-        if message.author.bot or self.is_channel_ignored(message.channel.id):
+        # Ajout d'un délai minimum entre les gains d'XP pour les messages (la clé expire après le délai)
+        if not await self.last_message_xp.claim(user_id):
             return
-        
-        user_id = str(message.author.id)
-        now = datetime.utcnow()
 
-        # Ajout d'un délai minimum entre les gains d'XP pour les messages
-        if user_id in self.last_message_xp and now - self.last_message_xp[user_id] < timedelta(seconds=60):
-            return
-        
-        self.last_message_xp[user_id] = now
         xp_gained = random.randint(XP_LIMITS["message"]["min"], XP_LIMITS["message"]["max"])
-        self.update_user_data(user_id, xp_gained, source="Message")
+        await self.update_user_data(user_id, xp_gained, source="Message")
 
     @commands.Cog.listener()
     async def on_reaction_add(self, reaction, user):
@@ -160,103 +455,214 @@ class XPSystem(commands.Cog):
         user_id = str(user.id)
 
         # Empêcher de gagner de l'XP plusieurs fois pour la même réaction/message
-        if message_id in self.reaction_tracking and user_id in self.reaction_tracking[message_id]:
+        if not await self.reaction_tracking.claim((message_id, user_id)):
             return
-        
-        if message_id not in self.reaction_tracking:
-            self.reaction_tracking[message_id] = set()
 
-        self.reaction_tracking[message_id].add(user_id)
         xp_gained = random.randint(XP_LIMITS["reaction"]["min"], XP_LIMITS["reaction"]["max"])
-        self.update_user_data(user_id, xp_gained, source="Réaction")
+        await self.update_user_data(user_id, xp_gained, source="Réaction")
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
-        """Ajoute de l'XP lorsqu'un utilisateur est actif dans un salon vocal."""
-        user_id = str(member.id)
-        if member.bot:
+        """Ouvre ou ferme la session vocale d'un utilisateur (l'XP est créditée à la sortie et aux points de contrôle)."""
+        if member.bot or before.channel == after.channel:
             return
+        user_id = str(member.id)
 
-        # Si l'utilisateur rejoint un salon vocal
-        if after.channel and not before.channel:
-            if self.is_channel_ignored(after.channel.id):  # Vérifie si le salon est ignoré
-                return
-            if user_id not in self.vocal_timers:
-                # Démarrer un timer pour cet utilisateur
-                self.vocal_timers[user_id] = self.start_vocal_timer(member)
-
-        # Si l'utilisateur quitte le salon vocal
-        elif not after.channel and before.channel:
-            if user_id in self.vocal_timers:
-                # Annuler le timer de cet utilisateur
-                self.vocal_timers[user_id].cancel()
-                del self.vocal_timers[user_id]
-
-    def start_vocal_timer(self, member):
-        """Démarre un timer pour ajouter de l'XP toutes les minutes."""
-        async def add_vocal_xp():
-            while True:
-                await discord.utils.sleep_until(datetime.utcnow() + timedelta(seconds=60))
-                if not member.voice or not member.voice.channel:  # Vérifie si l'utilisateur est encore en vocal
-                    break
-                xp_gained = random.randint(XP_LIMITS["vocal"]["min"], XP_LIMITS["vocal"]["max"])
-                self.update_user_data(str(member.id), xp_gained, source="Vocal")
-
-        return self.bot.loop.create_task(add_vocal_xp())
+        # L'utilisateur quitte le vocal ou rejoint un salon ignoré : fin de session
+        if not after.channel or self.is_channel_ignored(after.channel.id):
+            await self.end_voice_session(user_id)
+        # L'utilisateur rejoint un salon vocal (ou change de salon) : début de session si besoin
+        elif user_id not in self.voice_sessions:
+            now = time.time()
+            if await self.voice_state.claim(user_id, now):
+                self.voice_sessions[user_id] = now
+
+    def members_in_voice(self):
+        """Utilisateurs présents dans un salon vocal non ignoré des serveurs de ce processus."""
+        in_voice = set()
+        for guild in self.bot.guilds:
+            for channel in guild.voice_channels + guild.stage_channels:
+                if self.is_channel_ignored(channel.id):
+                    continue
+                in_voice.update(str(member.id) for member in channel.members if not member.bot)
+        return in_voice
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Reconstruit les sessions vocales à partir des états vocaux des serveurs (redémarrage, reconnexion)."""
+        in_voice = self.members_in_voice()
+
+        # Sessions d'utilisateurs partis pendant une déconnexion
+        for user_id in set(self.voice_sessions) - in_voice:
+            await self.end_voice_session(user_id)
+        now = time.time()
+        for user_id in in_voice - set(self.voice_sessions):
+            # Ces serveurs ne sont reçus que par ce processus : une session encore enregistrée
+            # (redémarrage récent) est reprise avec son début, sinon une nouvelle commence
+            started = await self.voice_state.get(user_id) or now
+            await self.voice_state.put(user_id, started)
+            self.voice_sessions[user_id] = started
+        logging.info(f"{len(self.voice_sessions)} session(s) vocale(s) en cours récupérée(s).")
+
+    def credit_voice_minutes(self, user_id, now):
+        """Retourne l'XP des minutes complètes passées en vocal et avance le début de la session d'autant."""
+        minutes = int((now - self.voice_sessions[user_id]) // VOICE["minute"])
+        self.voice_sessions[user_id] += minutes * VOICE["minute"]
+        return sum(random.randint(XP_LIMITS["vocal"]["min"], XP_LIMITS["vocal"]["max"]) for _ in range(minutes))
+
+    async def end_voice_session(self, user_id):
+        """Ferme la session vocale d'un utilisateur en créditant les minutes restantes."""
+        if user_id not in self.voice_sessions:
+            return
+        xp_gained = self.credit_voice_minutes(user_id, time.time())
+        del self.voice_sessions[user_id]
+        await self.voice_state.delete(user_id)
+        if xp_gained:
+            await self.update_user_data(user_id, xp_gained, source="Vocal")
+
+    @tasks.loop(seconds=VOICE["checkpoint"])
+    async def voice_checkpoint(self):
+        """Crédite en une passe l'XP vocale de toutes les sessions en cours."""
+        now = time.time()
+        for user_id in list(self.voice_sessions):
+            if user_id not in self.voice_sessions:
+                continue
+            xp_gained = self.credit_voice_minutes(user_id, now)
+            # Le nouveau début prolonge la réservation (écriture groupée par le backend)
+            await self.voice_state.put(user_id, self.voice_sessions[user_id])
+            if xp_gained:
+                await self.update_user_data(user_id, xp_gained, source="Vocal")
+
+        # Utilisateurs en vocal sans session : réservation refusée lors du changement de salon
+        # (session d'un autre processus pas encore fermée), retentée ici
+        for user_id in self.members_in_voice() - set(self.voice_sessions):
+            if await self.voice_state.claim(user_id, now):
+                self.voice_sessions[user_id] = now
 
     @app_commands.command(name="xp", description="Affiche l'XP et le niveau d'un utilisateur.")
+    @require_command_role("xp")
     async def check_xp(self, interaction: discord.Interaction, user: discord.Member = None):
         """Commande slash pour vérifier l'XP et le niveau d'un utilisateur."""
-        if not self.has_command_permission("xp", interaction.user):
-            await interaction.response.send_message(
-                "Tu n'as pas la permission d'utiliser cette commande.", ephemeral=True
-            )
-            return
-
         try:
             # Préviens Discord que la réponse est différée si nécessaire
             await interaction.response.defer(ephemeral=True)
 
             target_user = user if user else interaction.user
             user_id = str(target_user.id)
-            user_data = self.get_user_data(user_id)
+            user_data = await self.get_user_data(user_id)
             xp = user_data.get("xp", 0)
-            level = user_data.get("level", 1)
 
-            # Calcul de l'XP nécessaire pour passer au niveau suivant
-            xp_next_level = math.ceil((level + 1) ** (1 / XP_LIMITS["levels"]["multiplicator"]))
+            # Calcul du niveau et de l'XP nécessaire pour passer au niveau suivant, depuis la même table
+            level, _, remaining = LEVEL_CURVE.progress(xp)
+            next_level_text = f"**{remaining} XP**" if remaining is not None else "aucune, niveau maximum atteint"
+            rank = await self.get_rank(xp)
 
             # Envoie la réponse finale
             if user:
                 await interaction.followup.send(
                     f"L'XP de {target_user.mention} : **{xp} XP** et il est niveau **{level}**.\n"
-                    f"XP nécessaire pour le niveau suivant : **{xp_next_level - xp} XP**."
+                    f"XP nécessaire pour le niveau suivant : {next_level_text}.\n"
+                    f"Rang sur le serveur : **#{rank}**."
                 )
             else:
                 await interaction.followup.send(
                     f"{interaction.user.mention}, tu as actuellement **{xp} XP** et tu es niveau **{level}**.\n"
-                    f"XP nécessaire pour le niveau suivant : **{xp_next_level - xp} XP**."
+                    f"XP nécessaire pour le niveau suivant : {next_level_text}.\n"
+                    f"Tu es **#{rank}** du classement."
                 )
         except discord.errors.NotFound:
             logging.error("L'interaction n'est plus valide ou a expiré.")
         except Exception as e:
             logging.error(f"Erreur lors du traitement de la commande /xp : {e}")
 
+    @app_commands.command(name="leaderboard", description="Affiche le classement des utilisateurs par XP.")
+    @app_commands.describe(page="La page du classement à afficher.")
+    @require_command_role("leaderboard")
+    async def leaderboard(self, interaction: discord.Interaction, page: app_commands.Range[int, 1] = 1):
+        """Affiche une page du classement des utilisateurs par XP."""
+        try:
+            entries = await self.get_leaderboard_page(page)
+            page_count = max(1, math.ceil(self.leaderboard_total / LEADERBOARD["page_size"]))
+            if not entries:
+                await interaction.response.send_message(
+                    f"Cette page du classement est vide (il y a {page_count} page(s)).", ephemeral=True
+                )
+                return
+
+            start = (page - 1) * LEADERBOARD["page_size"]
+            levels = LEVEL_CURVE.levels_for(entry["xp"] for entry in entries)
+            lines = [
+                f"**#{start + index}** <@{entry['user_id']}> : **{entry['xp']} XP** (niveau {level})"
+                for index, (entry, level) in enumerate(zip(entries, levels), start=1)
+            ]
+            await interaction.response.send_message(
+                f"🏆 **Classement XP** (page {page}/{page_count})\n" + "\n".join(lines),
+                allowed_mentions=discord.AllowedMentions.none()
+            )
+        except Exception as e:
+            logging.error(f"Erreur lors du traitement de la commande /leaderboard : {e}")
+            await interaction.response.send_message("Une erreur est survenue lors de l'affichage du classement.", ephemeral=True)
+
+    @app_commands.command(name="xp-cache", description="Affiche la taille des caches du système d'XP.")
+    @require_command_role("xp-cache")
+    async def xp_cache(self, interaction: discord.Interaction):
+        """Affiche la taille des caches en mémoire du système d'XP."""
+        lines = []
+        for name, stats in self.cache_stats().items():
+            line = f"- `{name}` : {stats['size']} entrée(s)"
+            if "bytes" in stats:
+                line += f", ~{stats['bytes'] // 1024} Kio, {stats['evictions']} éviction(s)"
+            lines.append(line)
+        await interaction.response.send_message("📊 **Caches XP**\n" + "\n".join(lines), ephemeral=True)
+
+    @app_commands.command(name="xp-recompute-levels", description="Recalcule le niveau de tous les utilisateurs selon la courbe actuelle.")
+    async def recompute_levels_command(self, interaction: discord.Interaction):
+        """Recalcule les niveaux stockés après un changement de la courbe d'XP."""
+        if interaction.user.id != OWNER_ID:
+            await interaction.response.send_message("⛔ Seul l'administrateur peut utiliser cette commande !", ephemeral=True)
+            return
+        if self.level_job_lock.locked():
+            await interaction.response.send_message("⚠️ Un recalcul des niveaux est déjà en cours.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        started = time.monotonic()
+        last_report = 0
+
+        async def report(scanned, updated):
+            nonlocal last_report
+            now = time.monotonic()
+            if now - last_report < LEVEL_JOB["progress_interval"]:
+                return
+            last_report = now
+            await interaction.edit_original_response(
+                content=f"⏳ Recalcul en cours : {scanned} utilisateur(s) parcouru(s), {updated} niveau(x) modifié(s)."
+            )
+
+        async with self.level_job_lock:
+            try:
+                scanned, updated = await self.recompute_levels(report)
+                await interaction.edit_original_response(
+                    content=f"✅ Recalcul terminé en {time.monotonic() - started:.1f} s : "
+                            f"{scanned} utilisateur(s) parcouru(s), {updated} niveau(x) modifié(s)."
+                )
+            except Exception as e:
+                logging.error(f"Erreur lors du recalcul des niveaux : {e}")
+                await interaction.edit_original_response(
+                    content="❌ Le recalcul a été interrompu. Relance la commande pour reprendre au dernier lot traité."
+                )
+
     @app_commands.command(name="xp-add", description="Ajoute de l'XP à un utilisateur.")
     @app_commands.describe(user="L'utilisateur à modifier.", xp_amount="Montant d'XP à ajouter.")
+    @require_command_role("xp-add")
     async def add_xp(self, interaction: discord.Interaction, user: discord.Member, xp_amount: int):
         """Ajoute de l'XP à un utilisateur."""
-        if not self.has_command_permission("xp-add", interaction.user):
-            await interaction.response.send_message(
-                "Tu n'as pas la permission d'utiliser cette commande.", ephemeral=True
-            )
-            return
-        
         try:
-            self.update_user_data(
+            await self.update_user_data(
                 str(user.id), 
                 xp_amount, 
-                source=f"Manuel (par {interaction.user.display_name})"
+                source=f"Manuel (par {interaction.user.display_name})",
+                immediate=True
             )
             await interaction.response.send_message(
                 f"Ajout de {xp_amount} XP à {user.mention} (par {interaction.user.mention}).", ephemeral=True
@@ -267,19 +673,15 @@ class XPSystem(commands.Cog):
 
     @app_commands.command(name="xp-remove", description="Retire de l'XP à un utilisateur.")
     @app_commands.describe(user="L'utilisateur à modifier.", xp_amount="Montant d'XP à retirer.")
+    @require_command_role("xp-remove")
     async def remove_xp(self, interaction: discord.Interaction, user: discord.Member, xp_amount: int):
         """Retire de l'XP à un utilisateur."""
-        if not self.has_command_permission("xp-remove", interaction.user):
-            await interaction.response.send_message(
-                "Tu n'as pas la permission d'utiliser cette commande.", ephemeral=True
-            )
-            return
-        
         try:
-            self.update_user_data(
+            await self.update_user_data(
                 str(user.id), 
                 -xp_amount, 
-                source=f"Manuel (par {interaction.user.display_name})"
+                source=f"Manuel (par {interaction.user.display_name})",
+                immediate=True
             )
             await interaction.response.send_message(
                 f"Retrait de {xp_amount} XP à {user.mention} (par {interaction.user.mention}).", ephemeral=True
@@ -290,20 +692,16 @@ class XPSystem(commands.Cog):
 
     @app_commands.command(name="ignore-channel", description="Ajoute un salon (textuel ou vocal) à la liste des salons ignorés pour les gains d'XP.")
     @app_commands.describe(channel="Le salon (textuel ou vocal) à ignorer.")
+    @require_command_role("ignore-channel")
     async def ignore_channel(self, interaction: discord.Interaction, channel: discord.abc.GuildChannel):
         """Ajoute un salon (textuel ou vocal) à la liste des salons ignorés."""
-        if not self.has_command_permission("ignore-channel", interaction.user):
-            await interaction.response.send_message(
-                "Tu n'as pas la permission d'utiliser cette commande.", ephemeral=True
-            )
-            return
-
         try:
-            self.db["ignored_channels"].update_one(
+            await self.storage["ignored_channels"].update_one(
                 {"channel_id": channel.id},
                 {"$set": {"channel_id": channel.id}},
                 upsert=True
             )
+            self.ignored_channels.add(channel.id)
             await interaction.response.send_message(f"Le salon {channel.mention} est maintenant ignoré pour les gains d'XP.", ephemeral=True)
         except Exception as e:
             logging.error(f"Erreur lors de l'ajout du salon ignoré : {e}")
@@ -311,16 +709,12 @@ class XPSystem(commands.Cog):
 
     @app_commands.command(name="unignore-channel", description="Supprime un salon (textuel ou vocal) de la liste des salons ignorés pour les gains d'XP.")
     @app_commands.describe(channel="Le salon (textuel ou vocal) à ne plus ignorer.")
+    @require_command_role("unignore-channel")
     async def unignore_channel(self, interaction: discord.Interaction, channel: discord.abc.GuildChannel):
         """Supprime un salon (textuel ou vocal) de la liste des salons ignorés."""
-        if not self.has_command_permission("unignore-channel", interaction.user):
-            await interaction.response.send_message(
-                "Tu n'as pas la permission d'utiliser cette commande.", ephemeral=True
-            )
-            return
-
         try:
-            self.db["ignored_channels"].delete_one({"channel_id": channel.id})
+            await self.storage["ignored_channels"].delete_one({"channel_id": channel.id})
+            self.ignored_channels.discard(channel.id)
             await interaction.response.send_message(f"Le salon {channel.mention} n'est plus ignoré pour les gains d'XP.", ephemeral=True)
         except Exception as e:
             logging.error(f"Erreur lors de la suppression du salon ignoré : {e}")
@@ -339,11 +733,12 @@ class XPSystem(commands.Cog):
             #    return
 
             # Ajouter le rôle dans MongoDB
-            self.db["command_roles"].update_one(
+            await self.storage["command_roles"].update_one(
                 {"command": command},
                 {"$addToSet": {"roles": role.id}},  # Ajoute le rôle uniquement s'il n'existe pas déjà
                 upsert=True
             )
+            self.permissions.allow(command, role.id)
 
             # Réponse à l'utilisateur
             await interaction.response.send_message(
@@ -370,10 +765,11 @@ class XPSystem(commands.Cog):
             #    return
 
             # Retirer le rôle dans MongoDB
-            result = self.db["command_roles"].update_one(
+            result = await self.storage["command_roles"].update_one(
                 {"command": command},
                 {"$pull": {"roles": role.id}}  # Supprime ce rôle de la liste
             )
+            self.permissions.deny(command, role.id)
 
             # Vérifier si un rôle a été effectivement retiré
             if result.modified_count > 0:
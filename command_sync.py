@@ -0,0 +1,68 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+import discord
+
+# Fichier local mémorisant la signature du dernier arbre de commandes synchronisé, par application et portée
+CACHE_PATH = os.getenv("COMMAND_SYNC_CACHE", ".command_sync.json")
+
+
+def tree_signature(tree, guild=None):
+    """Empreinte stable de l'arbre tel qu'il serait envoyé à Discord.
+
+    La charge utile de synchronisation (noms, descriptions, paramètres, choix, indicateurs
+    d'auto-complétion, permissions par défaut) est sérialisée avec des clés triées et
+    les commandes rangées par type et par nom, puis hachée.
+    """
+    payload = [command.to_dict(tree) for command in tree.get_commands(guild=guild)]
+    payload.sort(key=lambda command: (command.get("type", 1), command["name"]))
+    serialized = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def load_cache():
+    try:
+        with open(CACHE_PATH, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Cache de synchronisation illisible, il sera recréé : {e}")
+        return {}
+
+
+def save_cache(cache):
+    try:
+        with open(CACHE_PATH, "w", encoding="utf-8") as file:
+            json.dump(cache, file, indent=2)
+    except OSError as e:
+        logging.warning(f"Impossible d'écrire le cache de synchronisation : {e}")
+
+
+async def sync_commands(bot, guild_id=None, force=False):
+    """Synchronise l'arbre de commandes uniquement si sa signature a changé depuis la dernière fois.
+
+    Avec `guild_id`, les commandes globales sont copiées sur ce serveur et synchronisées
+    pour lui seul : la mise à jour est immédiate, ce qui convient au développement.
+    Retourne True si une synchronisation a été envoyée à Discord.
+    """
+    guild = discord.Object(id=guild_id) if guild_id else None
+    if guild:
+        bot.tree.copy_global_to(guild=guild)
+
+    scope = f"{bot.application_id}:{guild_id or 'global'}"
+    signature = tree_signature(bot.tree, guild=guild)
+    cache = load_cache()
+    if not force and cache.get(scope) == signature:
+        logging.info(f"Commandes inchangées ({scope}), synchronisation ignorée.")
+        return False
+
+    start = time.perf_counter()
+    synced = await bot.tree.sync(guild=guild)
+    cache[scope] = signature
+    save_cache(cache)
+    logging.info(f"{len(synced)} commande(s) synchronisée(s) ({scope}) en {time.perf_counter() - start:.2f}s.")
+    return True
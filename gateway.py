@@ -0,0 +1,155 @@
+import ast
+import logging
+import os
+from pathlib import Path
+
+import discord
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+COGS_DIR = Path(__file__).resolve().parent / "cogs"
+
+# Intents nécessaires pour recevoir chaque événement écouté par un cog
+LISTENER_INTENTS = {
+    "on_message": ("guild_messages", "message_content"),
+    "on_message_edit": ("guild_messages", "message_content"),
+    "on_message_delete": ("guild_messages",),
+    "on_reaction_add": ("guild_reactions",),
+    "on_reaction_remove": ("guild_reactions",),
+    "on_raw_reaction_add": ("guild_reactions",),
+    "on_raw_reaction_remove": ("guild_reactions",),
+    "on_voice_state_update": ("voice_states",),
+    "on_member_join": ("members",),
+    "on_member_remove": ("members",),
+    "on_member_update": ("members",),
+    "on_presence_update": ("presences",),
+    "on_typing": ("guild_typing",),
+}
+
+# Commandes préfixées (et hybrides) : le contenu des messages est nécessaire pour lire le préfixe,
+# en serveur comme en message privé
+PREFIX_COMMAND_INTENTS = ("guild_messages", "dm_messages", "message_content")
+
+# Besoins qui ne se voient pas dans les écouteurs : cache des membres lu directement par une extension
+EXTENSION_INTENTS = {
+    "absences": ("members",),      # guild.get_member pour le rappel de fin d'absence
+    "xp_system": ("voice_states",),  # channel.members des salons vocaux au démarrage
+    "backfill": ("message_content",),  # contenu des messages de l'historique pour la gênance
+}
+
+
+def decorator_name(node):
+    """Nom pointé d'un décorateur : "commands.Cog.listener", "commands.hybrid_command"..."""
+    if isinstance(node, ast.Call):
+        node = node.func
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def extension_intents(extension):
+    """Déduit les intents d'une extension en lisant son code source, sans l'importer."""
+    tree = ast.parse((COGS_DIR / f"{extension}.py").read_text(encoding="utf-8"))
+    needed = set(EXTENSION_INTENTS.get(extension, ()))
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        for decorator_node in node.decorator_list:
+            decorator = decorator_name(decorator_node)
+            if decorator.endswith("Cog.listener"):
+                # @commands.Cog.listener("on_xxx") ou nom de la fonction
+                event = node.name
+                if isinstance(decorator_node, ast.Call) and decorator_node.args \
+                        and isinstance(decorator_node.args[0], ast.Constant):
+                    event = decorator_node.args[0].value
+                needed.update(LISTENER_INTENTS.get(event, ()))
+            elif decorator.split(".")[-1] in ("command", "group", "hybrid_command", "hybrid_group") \
+                    and not decorator.startswith("app_commands"):
+                needed.update(PREFIX_COMMAND_INTENTS)
+    return needed
+
+
+def build_intents(extensions):
+    """Intents de la passerelle : DISCORD_INTENTS ("all", "default" ou liste de noms) sinon déduits des extensions."""
+    configured = os.getenv("DISCORD_INTENTS")
+    if configured == "all":
+        return discord.Intents.all()
+    if configured == "default":
+        return discord.Intents.default()
+
+    intents = discord.Intents.none()
+    intents.guilds = True  # Salons, rôles et serveurs : indispensable au fonctionnement du cache
+    if configured:
+        names = {name.strip() for name in configured.split(",") if name.strip()}
+    else:
+        names = set()
+        for extension in extensions:
+            try:
+                names |= extension_intents(extension)
+            except (OSError, SyntaxError) as e:
+                logging.warning(f"Intents de cogs.{extension} non déduits : {e}")
+    for name in names:
+        if name not in discord.Intents.VALID_FLAGS:
+            logging.warning(f"Intent inconnu ignoré : {name}")
+            continue
+        setattr(intents, name, True)
+    return intents
+
+
+def member_cache_flags(intents):
+    """DISCORD_MEMBER_CACHE : "all", "none", "from_intents" (défaut) ou liste parmi voice, joined, online."""
+    configured = os.getenv("DISCORD_MEMBER_CACHE", "from_intents")
+    if configured == "all":
+        return discord.MemberCacheFlags.all()
+    if configured == "none":
+        return discord.MemberCacheFlags.none()
+    if configured == "from_intents":
+        return discord.MemberCacheFlags.from_intents(intents)
+    flags = discord.MemberCacheFlags.none()
+    for name in configured.split(","):
+        setattr(flags, name.strip(), True)
+    return flags
+
+
+def client_options(extensions):
+    """Paramètres de cache et d'intents passés au constructeur du bot."""
+    intents = build_intents(extensions)
+    flags = member_cache_flags(intents)
+    max_messages = int(os.getenv("DISCORD_MAX_MESSAGES", 1000))
+    options = {
+        "intents": intents,
+        "member_cache_flags": flags,
+        # 0 désactive le cache des messages (None pour discord.py)
+        "max_messages": max_messages or None,
+        # Récupération de tous les membres au démarrage : coûteux sur les gros serveurs
+        "chunk_guilds_at_startup": os.getenv("DISCORD_CHUNK_GUILDS", "0") == "1" and intents.members,
+    }
+    enabled = sorted(name for name, value in intents if value)
+    logging.info(
+        f"Intents : {', '.join(enabled)} ; cache des membres : {flags.value:#x} ; "
+        f"messages en cache : {options['max_messages']} ; chunking : {options['chunk_guilds_at_startup']}."
+    )
+    return options
+
+
+def cache_footprint(bot):
+    """Résumé du contenu des caches de discord.py et de la mémoire résidente maximale du processus."""
+    members = sum(len(guild.members) for guild in bot.guilds)
+    channels = sum(len(guild.channels) for guild in bot.guilds)
+    messages = len(bot.cached_messages)
+    summary = (
+        f"Caches : {len(bot.guilds)} serveur(s), {channels} salon(s), {members} membre(s), "
+        f"{len(bot.users)} utilisateur(s), {messages} message(s)"
+    )
+    if resource is None:
+        return summary + "."
+    # ru_maxrss est exprimé en kilo-octets sous Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return summary + f" ; mémoire résidente max {rss:.1f} Mo."
@@ -0,0 +1,151 @@
+from collections import deque, namedtuple
+
+# Résultat d'une analyse : mots gênants détectés (par ordre de priorité) et présence d'un mot exclu
+ScanResult = namedtuple("ScanResult", ["words", "excluded"])
+
+GENANCE = 0
+EXCLUDED = 1
+
+
+def parse_substitutions(substitutions):
+    """Transforme {"e": "[e3€]", ...} en table caractère -> lettre canonique."""
+    translation = {}
+    for letter, variants in substitutions.items():
+        for char in variants.strip("[]"):
+            translation[char] = letter
+    return translation
+
+
+def is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+class GenanceMatcher:
+    """Détecteur multi-mots en une seule passe (automate d'Aho-Corasick).
+
+    Le message est d'abord normalisé une fois : mise en minuscules, substitutions de lettres
+    ("3" -> "e", "@" -> "a"...) puis fusion des lettres répétées ("feeeur" -> "feur").
+    Les mots gênants et les mots exclus sont ensuite tous cherchés dans le même parcours,
+    dont le coût ne dépend pas du nombre de mots. Les mots contenant une lettre doublée
+    ("lette") vérifient en plus la longueur des répétitions sur les seuls candidats trouvés.
+    """
+
+    def __init__(self, words, excluded_words, substitutions):
+        self.words = list(words)  # L'ordre des mots définit leur priorité
+        self.excluded_words = list(excluded_words)
+        self.translation = parse_substitutions(substitutions)
+
+        # Automate : transitions, liens d'échec et sorties (type, index) de chaque état
+        self.transitions = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        for index, word in enumerate(self.words):
+            self.add_pattern(self.runs(word.lower()), (GENANCE, index))
+        for index, word in enumerate(self.excluded_words):
+            self.add_pattern(self.runs(word.lower()), (EXCLUDED, index))
+        self.build_links()
+
+    def runs(self, text):
+        """Applique les substitutions de lettres et regroupe les répétitions : [(lettre, nombre), ...]."""
+        result = []
+        for char in text:
+            char = self.translation.get(char, char)
+            if result and result[-1][0] == char:
+                result[-1][1] += 1
+            else:
+                result.append([char, 1])
+        return result
+
+    def run_length(self, lowered, start):
+        """Nombre de caractères consécutifs normalisés identiques à partir d'une position."""
+        char = self.translation.get(lowered[start], lowered[start])
+        end = start + 1
+        while end < len(lowered) and self.translation.get(lowered[end], lowered[end]) == char:
+            end += 1
+        return end - start
+
+    def add_pattern(self, runs, output):
+        # Nombre minimum de répétitions par lettre, seulement si le mot contient une lettre doublée
+        minimums = [count for _, count in runs] if any(count > 1 for _, count in runs) else None
+        state = 0
+        for char, _ in runs:
+            if char not in self.transitions[state]:
+                self.transitions.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+                self.transitions[state][char] = len(self.transitions) - 1
+            state = self.transitions[state][char]
+        self.outputs[state].append((output, len(runs), minimums))
+
+    def build_links(self):
+        """Calcule les liens d'échec en largeur et fusionne les sorties des suffixes."""
+        queue = deque(self.transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.transitions[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.transitions[fallback].get(char, 0)
+                if self.fail[child] == child:
+                    self.fail[child] = 0
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def scan(self, content):
+        """Analyse un message et retourne les mots gênants trouvés et la présence d'un mot exclu."""
+        return self.scan_lowered(content.lower())
+
+    def scan_lowered(self, lowered):
+        """Comme scan(), pour un contenu déjà mis en minuscules."""
+        found = set()
+        excluded = False
+
+        state = 0
+        previous = None
+        # Position, dans le texte d'origine, du début de chaque caractère normalisé
+        starts = []
+        for position, raw_char in enumerate(lowered):
+            char = self.translation.get(raw_char, raw_char)
+            if char == previous:
+                continue  # Répétition fusionnée
+            previous = char
+            starts.append(position)
+
+            while state and char not in self.transitions[state]:
+                state = self.fail[state]
+            state = self.transitions[state].get(char, 0)
+
+            for (kind, index), length, minimums in self.outputs[state]:
+                if minimums and not all(
+                    self.run_length(lowered, start) >= minimum
+                    for start, minimum in zip(starts[-length:], minimums)
+                ):
+                    continue
+                if kind == GENANCE:
+                    found.add(index)
+                elif not excluded:
+                    # Fin de la première répétition (début de la suivante), inconnue pour un mot d'une seule lettre
+                    first_run_end = starts[-length + 1] if length > 1 else None
+                    excluded = self.is_exact_word(
+                        lowered, starts[-length], first_run_end, position, self.excluded_words[index]
+                    )
+
+        return ScanResult([self.words[index] for index in sorted(found)], excluded)
+
+    def is_exact_word(self, lowered, start, first_run_end, last, word):
+        """Vérifie qu'un mot exclu apparaît tel quel et en mot entier (équivalent de \\bmot\\b)."""
+        # La première lettre normalisée peut couvrir des caractères qui précèdent le mot ("@" dans "@apagnan") :
+        # le mot commence autant de caractères avant la fin de cette répétition que sa propre première répétition
+        if first_run_end is not None:
+            first_run = self.runs(word.lower())[0][1]
+            start = max(start, first_run_end - first_run)
+        # Le dernier caractère normalisé peut couvrir une répétition : on avance jusqu'à la fin du mot
+        end = last + 1
+        while end < len(lowered) and end - start < len(word) and lowered[end] == lowered[last]:
+            end += 1
+        if lowered[start:end] != word.lower():
+            return False
+        before_ok = start == 0 or not is_word_char(lowered[start - 1])
+        after_ok = end == len(lowered) or not is_word_char(lowered[end])
+        return before_ok and after_ok
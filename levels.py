@@ -0,0 +1,114 @@
+import bisect
+from fractions import Fraction
+
+# Nombre de niveaux calculés à la construction d'une courbe ; la table s'agrandit au besoin
+DEFAULT_MAX_LEVEL = 200
+
+
+def power_threshold(level, exponent):
+    """XP minimale (entière) telle que floor(xp ** exponent) >= level, calculée sans erreur d'arrondi.
+
+    Avec exponent = p/q, xp ** (p/q) >= level équivaut à xp ** p >= level ** q :
+    la comparaison se fait entièrement sur des entiers.
+    """
+    p, q = exponent.numerator, exponent.denominator
+    target = level ** q
+    xp = max(0, int(level ** (q / p)))  # Estimation flottante, corrigée ci-dessous
+    while xp ** p < target:
+        xp += 1
+    while xp > 0 and (xp - 1) ** p >= target:
+        xp -= 1
+    return xp
+
+
+class LevelCurve:
+    """Table croissante des seuils d'XP : thresholds[n] est l'XP minimale pour atteindre le niveau n.
+
+    Le niveau d'une XP donnée est trouvé par bisection, en O(log n).
+    """
+
+    def __init__(self, thresholds, exponent=None):
+        thresholds = [int(xp) for xp in thresholds]
+        if not thresholds or thresholds[0] != 0:
+            raise ValueError("Le premier seuil (niveau 0) doit être 0.")
+        if any(current >= following for current, following in zip(thresholds, thresholds[1:])):
+            raise ValueError("Les seuils de niveaux doivent être strictement croissants.")
+        self.thresholds = thresholds
+        # Exposant de la courbe puissance, pour prolonger la table ; None pour une table fixe
+        self.exponent = exponent
+
+    @classmethod
+    def power(cls, multiplicator, max_level=DEFAULT_MAX_LEVEL):
+        """Courbe niveau = floor(xp ** multiplicator)."""
+        exponent = Fraction(str(multiplicator)).limit_denominator(1000)
+        return cls([power_threshold(level, exponent) for level in range(max_level + 1)], exponent)
+
+    @classmethod
+    def from_config(cls, config):
+        """Construit la courbe depuis XP_LIMITS["levels"] : table explicite "thresholds" ou "multiplicator"."""
+        if "thresholds" in config:
+            return cls(config["thresholds"])
+        return cls.power(config["multiplicator"])
+
+    @property
+    def max_level(self):
+        return len(self.thresholds) - 1
+
+    def signature(self):
+        """Identifiant stable de la courbe, pour détecter un changement de configuration."""
+        if self.exponent is not None:
+            return f"power:{self.exponent}"
+        return "table:" + ",".join(map(str, self.thresholds))
+
+    def ensure(self, xp):
+        """Prolonge une courbe puissance jusqu'à couvrir l'XP donnée."""
+        if self.exponent is None:
+            return
+        while self.thresholds[-1] <= xp:
+            self.thresholds.append(power_threshold(len(self.thresholds), self.exponent))
+
+    def level_for(self, xp):
+        """Niveau correspondant à une quantité d'XP."""
+        if xp <= 0:
+            return 0
+        self.ensure(xp)
+        return bisect.bisect_right(self.thresholds, xp) - 1
+
+    def threshold(self, level):
+        """XP minimale du niveau donné (None si une table fixe ne va pas jusque-là)."""
+        if self.exponent is not None:
+            while len(self.thresholds) <= level:
+                self.thresholds.append(power_threshold(len(self.thresholds), self.exponent))
+        return self.thresholds[level] if level < len(self.thresholds) else None
+
+    def progress(self, xp):
+        """Retourne (niveau, XP acquise dans le niveau, XP manquante pour le suivant ou None)."""
+        level = self.level_for(xp)
+        next_threshold = self.threshold(level + 1)
+        remaining = next_threshold - xp if next_threshold is not None else None
+        return level, xp - self.thresholds[level], remaining
+
+    def levels_for(self, xps):
+        """Niveaux d'un lot d'XP en une seule passe sur la table (tri puis fusion)."""
+        xps = list(xps)
+        if not xps:
+            return []
+        self.ensure(max(xps))
+        levels = [0] * len(xps)
+        level = 0
+        for index in sorted(range(len(xps)), key=xps.__getitem__):
+            xp = xps[index]
+            while level < self.max_level and self.thresholds[level + 1] <= xp:
+                level += 1
+            levels[index] = level
+        return levels
+
+    def progress_for(self, xps):
+        """Version par lot de progress()."""
+        xps = list(xps)
+        results = []
+        for xp, level in zip(xps, self.levels_for(xps)):
+            next_threshold = self.threshold(level + 1)
+            remaining = next_threshold - xp if next_threshold is not None else None
+            results.append((level, xp - self.thresholds[level], remaining))
+        return results
@@ -0,0 +1,85 @@
+import asyncio
+import contextvars
+import logging
+import time
+
+# Extensions chargées par vagues : les extensions d'une même vague sont chargées en parallèle,
+# une vague ne commence qu'une fois la précédente terminée (ingest doit exister avant ses consommateurs).
+EXTENSION_WAVES = [
+    ['ingest'],
+    ['xp_system', 'genance', 'random', 'ping', 'mimir', 'poke', 'sun', 'messages', 'bug_report', 'status', 'events', 'absences', 'diagnostics', 'backfill'],
+]
+
+# Extension en cours de chargement dans la tâche courante, pour attribuer les appels à add_cog
+current_extension = contextvars.ContextVar("current_extension", default=None)
+
+
+class StartupTimings:
+    """Durées de démarrage par extension : import (module et constructeur), cog_load, et instant où elle est prête."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.extensions = {}  # extension -> {"begin", "import", "cog_load", "ready", "error"}
+        self.gateway_ready = None
+
+    def begin(self, extension):
+        self.extensions[extension] = {"begin": time.perf_counter(), "import": None, "cog_load": 0.0, "ready": None, "error": None}
+
+    def cog_added(self, extension, started):
+        """Appelé à l'entrée de add_cog : tout ce qui précède est l'exécution du module et du constructeur."""
+        timing = self.extensions.get(extension)
+        if timing is not None and timing["import"] is None:
+            timing["import"] = started - timing["begin"]
+
+    def cog_loaded(self, extension, duration):
+        timing = self.extensions.get(extension)
+        if timing is not None:
+            timing["cog_load"] += duration
+
+    def finish(self, extension, error=None):
+        timing = self.extensions[extension]
+        timing["ready"] = time.perf_counter() - self.started
+        timing["error"] = error
+        if timing["import"] is None:
+            timing["import"] = time.perf_counter() - timing["begin"]
+
+    def report(self):
+        """Tableau lisible des durées, trié du chargement le plus lent au plus rapide."""
+        lines = ["Rapport de démarrage (import+constructeur / cog_load / prête à) :"]
+        ordered = sorted(self.extensions.items(), key=lambda item: item[1]["import"] + item[1]["cog_load"], reverse=True)
+        for extension, timing in ordered:
+            status = f" ÉCHEC : {timing['error']}" if timing["error"] else ""
+            lines.append(
+                f"  {extension:<12} {timing['import'] * 1000:8.1f} ms {timing['cog_load'] * 1000:8.1f} ms "
+                f"{timing['ready'] * 1000:9.1f} ms{status}"
+            )
+        if self.gateway_ready is not None:
+            lines.append(f"  Passerelle prête à {self.gateway_ready * 1000:.1f} ms.")
+        return "\n".join(lines)
+
+
+async def load_extension_isolated(bot, extension):
+    """Charge une extension ; une erreur est journalisée et l'extension ignorée, sans arrêter le bot."""
+    current_extension.set(extension)
+    bot.startup_timings.begin(extension)
+    try:
+        await bot.load_extension(f'cogs.{extension}')
+    except Exception as e:
+        logging.exception(f"Échec du chargement de cogs.{extension}, extension ignorée.")
+        bot.startup_timings.finish(extension, error=e.__class__.__name__)
+        return False
+    bot.startup_timings.finish(extension)
+    logging.info(f'Loaded: cogs.{extension}')
+    return True
+
+
+async def load_extensions(bot, waves=EXTENSION_WAVES):
+    """Charge toutes les vagues d'extensions et retourne la liste de celles qui ont échoué."""
+    failed = []
+    for wave in waves:
+        # Chaque chargement s'exécute dans sa propre tâche, avec sa propre valeur de current_extension
+        results = await asyncio.gather(*(load_extension_isolated(bot, extension) for extension in wave))
+        failed.extend(extension for extension, loaded in zip(wave, results) if not loaded)
+    if failed:
+        logging.error(f"Extension(s) non chargée(s) : {', '.join(failed)}.")
+    return failed
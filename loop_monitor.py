@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from metrics import LOOP_LAG, LOOP_STALLS
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Nombre de cadres (les plus profonds) conservés par échantillon de pile
+STACK_DEPTH = 12
+
+
+def short_path(filename):
+    """Chemin relatif au projet pour ses fichiers, nom de module sinon."""
+    if filename.startswith(ROOT):
+        return os.path.relpath(filename, ROOT)
+    return os.path.basename(filename)
+
+
+class StallSample:
+    __slots__ = ("stack", "samples", "stalls", "total", "worst", "last_seen")
+
+    def __init__(self, stack):
+        self.stack = stack        # ((fichier, ligne, fonction, code), ...) du plus externe au plus profond
+        self.samples = 0          # Nombre de fois où la boucle a été trouvée bloquée sur cette pile
+        self.stalls = 0           # Nombre de blocages distincts
+        self.total = 0.0          # Part cumulée de la durée des blocages attribuée à cette pile (secondes)
+        self.worst = 0.0          # Durée du pire blocage pendant lequel cette pile a été échantillonnée
+        self.last_seen = 0.0
+
+
+class LoopWatchdog:
+    """Mesure en continu le retard de la boucle d'événements et échantillonne la pile qui la bloque.
+
+    Une tâche de la boucle note un battement toutes les `interval` secondes. Un thread de surveillance
+    vérifie ces battements : si le dernier date de plus de `threshold`, la boucle est bloquée et la pile
+    de son thread est capturée (sys._current_frames). Les piles sont regroupées pour le rapport.
+    """
+
+    def __init__(self, interval, threshold):
+        self.interval = interval
+        self.threshold = threshold
+        self.samples = {}  # pile -> StallSample
+        self.lock = threading.Lock()
+        self.last_beat = time.monotonic()
+        self.loop_thread_id = None
+        self.stall_keys = {}      # Pile -> nombre d'échantillons pendant le blocage en cours
+        self.next_sample = None   # Instant du prochain échantillon pendant un même blocage
+        self.worst_lag = 0.0
+        self.stopped = threading.Event()
+        self.task = None
+        self.thread = None
+
+    @classmethod
+    def from_env(cls):
+        """LOOP_LAG_INTERVAL_MS (défaut 100) et LOOP_LAG_THRESHOLD_MS (défaut 250)."""
+        interval = int(os.getenv("LOOP_LAG_INTERVAL_MS", 100)) / 1000
+        threshold = int(os.getenv("LOOP_LAG_THRESHOLD_MS", 250)) / 1000
+        return cls(interval, threshold)
+
+    def start(self):
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.task = asyncio.create_task(self.heartbeat())
+        self.thread = threading.Thread(target=self.monitor, name="loop-watchdog", daemon=True)
+        self.thread.start()
+        logging.info(f"Surveillance de la boucle d'événements active (seuil {self.threshold * 1000:.0f} ms).")
+
+    def stop(self):
+        self.stopped.set()
+        if self.task:
+            self.task.cancel()
+
+    async def heartbeat(self):
+        """Battement de la boucle : le retard d'un réveil est le temps pendant lequel elle était occupée."""
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            LOOP_LAG.observe(lag)
+            self.worst_lag = max(self.worst_lag, lag)
+            with self.lock:
+                self.last_beat = now
+                stall_keys, self.stall_keys, self.next_sample = self.stall_keys, {}, None
+                # Fin d'un blocage : sa durée est répartie entre les piles échantillonnées pendant celui-ci,
+                # au prorata de leurs échantillons (la somme des parts est la durée du blocage)
+                sampled = sum(stall_keys.values())
+                for key, count in stall_keys.items():
+                    sample = self.samples.get(key)
+                    if sample is None:
+                        continue  # Rapport réinitialisé pendant le blocage
+                    sample.stalls += 1
+                    sample.total += lag * count / sampled
+                    sample.worst = max(sample.worst, lag)
+            if stall_keys:
+                LOOP_STALLS.inc()
+
+    def monitor(self):
+        """Thread de surveillance : capture la pile du thread de la boucle quand elle ne bat plus."""
+        while not self.stopped.wait(self.interval / 2):
+            now = time.monotonic()
+            with self.lock:
+                blocked = now - self.last_beat - self.interval
+                if blocked < self.threshold or (self.next_sample is not None and now < self.next_sample):
+                    continue
+                # Un nouvel échantillon par seuil écoulé : un long blocage montre son évolution
+                self.next_sample = now + self.threshold
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            stack = tuple(
+                (short_path(entry.filename), entry.lineno, entry.name, (entry.line or "").strip())
+                for entry in traceback.extract_stack(frame)[-STACK_DEPTH:]
+            )
+            del frame
+            with self.lock:
+                sample = self.samples.get(stack)
+                first_in_stall = stack not in self.stall_keys
+                if sample is None:
+                    sample = self.samples[stack] = StallSample(stack)
+                sample.samples += 1
+                sample.last_seen = time.time()
+                self.stall_keys[stack] = self.stall_keys.get(stack, 0) + 1
+            if first_in_stall:
+                filename, lineno, name, line = stack[-1]
+                logging.warning(
+                    f"Boucle d'événements bloquée depuis {blocked * 1000:.0f} ms : {filename}:{lineno} dans {name} ({line})"
+                )
+
+    def report(self, limit=5):
+        """Piles les plus coûteuses, triées par durée cumulée de blocage."""
+        with self.lock:
+            ordered = sorted(self.samples.values(), key=lambda sample: (sample.total, sample.samples), reverse=True)
+            return [
+                {
+                    "stack": [f"{filename}:{lineno} dans {name} : {line}" for filename, lineno, name, line in sample.stack],
+                    "samples": sample.samples,
+                    "stalls": sample.stalls,
+                    "total_ms": sample.total * 1000,
+                    "worst_ms": sample.worst * 1000,
+                }
+                for sample in ordered[:limit]
+            ]
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.stall_keys.clear()
+            self.worst_lag = 0.0
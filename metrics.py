@@ -0,0 +1,155 @@
+import bisect
+import math
+
+# Bornes (secondes) des histogrammes de durée, de la milliseconde à la dizaine de secondes
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Compteur monotone, éventuellement décliné par étiquettes."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {}  # valeurs d'étiquettes -> total
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        for label_values, value in sorted(self.values.items()):
+            yield self.name, format_labels(self.labels, label_values), value
+
+
+class Histogram:
+    """Histogramme cumulatif au format Prometheus (_bucket, _sum, _count)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # valeurs d'étiquettes -> [compteurs par borne, somme, nombre]
+
+    def observe(self, value, *label_values):
+        series = self.values.get(label_values)
+        if series is None:
+            series = self.values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+        # Seule la première borne concernée est incrémentée ; le cumul est fait à l'export
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        names = self.labels + ("le",)
+        for label_values, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", format_labels(names, label_values + (format_value(bound),)), cumulative
+            yield f"{self.name}_bucket", format_labels(names, label_values + ("+Inf",)), count
+            yield f"{self.name}_sum", format_labels(self.labels, label_values), total
+            yield f"{self.name}_count", format_labels(self.labels, label_values), count
+
+
+class Gauge:
+    """Jauge calculée au moment de l'export par une fonction retournant [(valeurs d'étiquettes, valeur), ...]."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), collect=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def samples(self):
+        if self.collect is None:
+            return
+        for label_values, value in self.collect():
+            yield self.name, format_labels(self.labels, label_values), value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Exporte toutes les métriques au format texte de Prometheus (version 0.0.4)."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Métriques alimentées par le bot, ses extensions et le Storage
+EVENTS = REGISTRY.register(Counter(
+    "discord_events_total", "Événements de la passerelle reçus, par nom d'événement.", ["event"]
+))
+HANDLER_CALLS = REGISTRY.register(Counter(
+    "bot_handler_calls_total", "Appels des écouteurs et des commandes, par type, gestionnaire et résultat.",
+    ["kind", "handler", "outcome"]
+))
+HANDLER_LATENCY = REGISTRY.register(Histogram(
+    "bot_handler_duration_seconds", "Durée totale des appels d'écouteurs et de commandes.", ["kind", "handler"]
+))
+HANDLER_BUSY = REGISTRY.register(Counter(
+    "bot_handler_busy_seconds_total", "Temps passé à s'exécuter sur la boucle d'événements (hors attente d'E/S).",
+    ["kind", "handler"]
+))
+MESSAGE_STAGE_LATENCY = REGISTRY.register(Histogram(
+    "message_ingest_stage_duration_seconds", "Durée de chaque étape du traitement d'un message.", ["stage"]
+))
+MONGO_LATENCY = REGISTRY.register(Histogram(
+    "mongo_operation_duration_seconds", "Durée des opérations MongoDB, attente de l'exécuteur comprise.", ["operation"]
+))
+MONGO_ERRORS = REGISTRY.register(Counter(
+    "mongo_operation_errors_total", "Opérations MongoDB en erreur.", ["operation"]
+))
+LOOP_LAG = REGISTRY.register(Histogram(
+    "event_loop_lag_seconds", "Retard des réveils de la boucle d'événements (temps pendant lequel elle était occupée).",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+))
+LOOP_STALLS = REGISTRY.register(Counter(
+    "event_loop_stalls_total", "Blocages de la boucle d'événements au-delà du seuil de surveillance."
+))
+# Jauges calculées à l'export à partir de l'état du bot (fonctions fournies par le serveur HTTP)
+GATEWAY_LATENCY = REGISTRY.register(Gauge(
+    "discord_gateway_latency_seconds", "Latence du heartbeat de la passerelle, par shard.", ["shard"]
+))
+CACHE_SIZE = REGISTRY.register(Gauge(
+    "bot_cache_entries", "Nombre d'entrées des caches de discord.py et des cogs.", ["cache"]
+))
+
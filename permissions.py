@@ -0,0 +1,64 @@
+import logging
+
+from discord import app_commands
+
+# Commandes accessibles à tous, sans rôle configuré
+PUBLIC_COMMANDS = {"xp", "leaderboard"}
+
+
+class MissingCommandRole(app_commands.CheckFailure):
+    """Levée lorsque l'utilisateur n'a aucun des rôles autorisés pour une commande."""
+
+    def __init__(self, command_name):
+        self.command_name = command_name
+        super().__init__(f"Aucun rôle autorisé pour la commande {command_name}.")
+
+
+class PermissionResolver:
+    """Cache des rôles autorisés par commande, chargé depuis la collection command_roles."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.command_roles = {}  # nom de commande -> frozenset des IDs de rôles autorisés
+
+    async def load(self):
+        """Charge (ou recharge) toutes les autorisations depuis MongoDB."""
+        try:
+            documents = await self.collection.find({}, {"command": 1, "roles": 1})
+            self.command_roles = {
+                document["command"]: frozenset(document.get("roles", []))
+                for document in documents
+            }
+            logging.debug(f"Autorisations chargées pour {len(self.command_roles)} commande(s).")
+        except Exception as e:
+            logging.error(f"Erreur lors du chargement des rôles de commandes : {e}")
+
+    def allow(self, command_name, role_id):
+        self.command_roles[command_name] = self.command_roles.get(command_name, frozenset()) | {role_id}
+
+    def deny(self, command_name, role_id):
+        self.command_roles[command_name] = self.command_roles.get(command_name, frozenset()) - {role_id}
+
+    def has_permission(self, command_name, user):
+        """Vérifie, sans accès à la base, si l'utilisateur peut utiliser une commande."""
+        if command_name in PUBLIC_COMMANDS:
+            return True
+
+        # Si aucun rôle n'est configuré, l'accès est bloqué par défaut
+        allowed_roles = self.command_roles.get(command_name)
+        if not allowed_roles:
+            return False
+        return not allowed_roles.isdisjoint(role.id for role in getattr(user, "roles", ()))
+
+
+def require_command_role(command_name=None):
+    """Check app_commands réutilisable : l'utilisateur doit avoir un des rôles configurés pour la commande."""
+    async def predicate(interaction):
+        name = command_name or interaction.command.qualified_name
+        resolver = getattr(interaction.client, "permission_resolver", None)
+        if resolver is not None and resolver.has_permission(name, interaction.user):
+            return True
+        # Le refus est envoyé à l'utilisateur par le gestionnaire d'erreurs de l'arbre de commandes du bot
+        raise MissingCommandRole(name)
+
+    return app_commands.check(predicate)
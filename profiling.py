@@ -0,0 +1,143 @@
+import functools
+import logging
+import os
+import time
+
+from metrics import HANDLER_BUSY, HANDLER_CALLS, HANDLER_LATENCY
+
+# Longueur maximale du résumé d'un argument dans le journal des appels lents
+SUMMARY_LENGTH = 60
+
+
+class Passthrough:
+    """Rend à la tâche asyncio ce que la coroutine profilée attend (future ou None) et lui renvoie le réveil."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __await__(self):
+        return (yield self.value)
+
+
+def summarize(value):
+    """Résumé court d'un argument : type et ID pour les objets Discord, repr tronquée sinon."""
+    object_id = getattr(value, "id", None)
+    if isinstance(object_id, int):
+        return f"{type(value).__name__}({object_id})"
+    text = repr(value)
+    return text if len(text) <= SUMMARY_LENGTH else text[:SUMMARY_LENGTH - 1] + "…"
+
+
+class HandlerStats:
+    __slots__ = ("calls", "errors", "slow", "wall", "busy", "max_wall")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.slow = 0
+        self.wall = 0.0
+        self.busy = 0.0
+        self.max_wall = 0.0
+
+
+class Profiler:
+    """Mesure chaque appel d'écouteur et de commande : durée totale, temps actif sur la boucle et temps d'attente.
+
+    La coroutine est exécutée pas à pas : le temps passé entre deux suspensions est du temps actif
+    (calcul ou appel bloquant), le reste est de l'attente d'E/S. Le surcoût est de deux lectures
+    d'horloge par suspension.
+    """
+
+    def __init__(self, slow_threshold):
+        self.slow_threshold = slow_threshold
+        self.stats = {}  # gestionnaire -> HandlerStats
+
+    @classmethod
+    def from_env(cls):
+        """PROFILE_SLOW_MS : durée (ms) au-delà de laquelle un appel est journalisé (défaut 500)."""
+        return cls(int(os.getenv("PROFILE_SLOW_MS", 500)) / 1000)
+
+    async def run(self, kind, label, func, args, kwargs, skip=0):
+        coroutine = func(*args, **kwargs)
+        started = time.perf_counter()
+        busy = 0.0
+        value, error = None, None
+        failed = True
+        try:
+            while True:
+                step = time.perf_counter()
+                try:
+                    if error is not None:
+                        yielded = coroutine.throw(error)
+                    else:
+                        yielded = coroutine.send(value)
+                except StopIteration as stop:
+                    busy += time.perf_counter() - step
+                    failed = False
+                    return stop.value
+                except BaseException:
+                    busy += time.perf_counter() - step
+                    raise
+                busy += time.perf_counter() - step
+                value, error = None, None
+                try:
+                    value = await Passthrough(yielded)
+                except BaseException as e:  # Annulation ou exception à transmettre à la coroutine
+                    error = e
+        finally:
+            self.record(kind, label, time.perf_counter() - started, busy, failed, args[skip:], kwargs)
+
+    def record(self, kind, label, wall, busy, failed, args, kwargs):
+        stats = self.stats.get(label)
+        if stats is None:
+            stats = self.stats[label] = HandlerStats()
+        stats.calls += 1
+        stats.wall += wall
+        stats.busy += busy
+        stats.max_wall = max(stats.max_wall, wall)
+        if failed:
+            stats.errors += 1
+
+        HANDLER_CALLS.inc(kind, label, "error" if failed else "ok")
+        HANDLER_LATENCY.observe(wall, kind, label)
+        HANDLER_BUSY.inc(kind, label, amount=busy)
+
+        if wall >= self.slow_threshold:
+            stats.slow += 1
+            summary = ", ".join(
+                [summarize(arg) for arg in args] + [f"{name}={summarize(arg)}" for name, arg in kwargs.items()]
+            )
+            logging.warning(
+                f"Appel lent : {label} en {wall * 1000:.0f} ms "
+                f"(actif {busy * 1000:.0f} ms, attente {(wall - busy) * 1000:.0f} ms) ; arguments : {summary}"
+            )
+
+    def wrap(self, kind, label, func, skip=0):
+        """Version profilée d'une fonction coroutine (écouteur ou callback de commande).
+
+        `skip` : nombre de premiers arguments omis du résumé (le cog pour un callback de commande).
+        """
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await self.run(kind, label, func, args, kwargs, skip)
+
+        return wrapper
+
+    def report(self, limit=15):
+        """Gestionnaires triés par temps total, avec moyenne, maximum et part d'attente."""
+        ordered = sorted(self.stats.items(), key=lambda item: item[1].wall, reverse=True)
+        return [
+            {
+                "handler": label,
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "slow": stats.slow,
+                "total_ms": stats.wall * 1000,
+                "avg_ms": stats.wall / stats.calls * 1000,
+                "max_ms": stats.max_wall * 1000,
+                "busy_ms": stats.busy * 1000,
+            }
+            for label, stats in ordered[:limit]
+        ]
@@ -0,0 +1,111 @@
+import logging
+import time
+from collections import namedtuple
+
+from pymongo import ASCENDING, DESCENDING  # type: ignore
+from pymongo.errors import OperationFailure  # type: ignore
+
+# Index déclaré : collection, clés [(champ, sens)], unicité, options supplémentaires de create_index
+Index = namedtuple("Index", ["collection", "keys", "unique", "options"], defaults=[{}])
+
+# Registre des index attendus, appliqué à chaque démarrage (la création est idempotente)
+INDEXES = [
+    Index("xp_data", [("user_id", ASCENDING)], True),
+    Index("xp_data", [("xp", DESCENDING)], False),  # Classement et calcul du rang
+    Index("genance_data", [("user_id", ASCENDING)], True),
+    Index("genance_data", [("genance_points", DESCENDING)], False),  # /genance-top
+    Index("ignored_channels", [("channel_id", ASCENDING)], True),
+    Index("command_roles", [("command", ASCENDING)], True),
+    Index("events", [("name", ASCENDING)], True),
+    Index("event_participants", [("user_id", ASCENDING), ("event_name", ASCENDING)], True),
+    Index("event_participants", [("event_name", ASCENDING)], False),  # Suppression d'un événement
+    Index("absences", [("end", ASCENDING)], False),  # Absences expirées
+    Index("absences", [("user_id", ASCENDING)], False),
+    Index("bot_status", [("bot_id", ASCENDING)], True),
+    Index("backfill_checkpoints", [("channel_id", ASCENDING)], True),
+    Index("jobs", [("job", ASCENDING)], True),
+    # État partagé entre processus : MongoDB supprime les documents expirés
+    Index("shared_state", [("expires_at", ASCENDING)], False, {"expireAfterSeconds": 0}),
+]
+
+# Document contenant la version du schéma déjà appliquée
+SCHEMA_ID = "schema"
+
+
+async def remove_duplicates(collection, fields, keep_sort):
+    """Supprime les doublons d'une clé en gardant, pour chaque valeur, le premier document selon `keep_sort`."""
+    groups = await collection.aggregate([
+        {"$sort": keep_sort},
+        {"$group": {
+            "_id": {field: f"${field}" for field in fields},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    duplicates = [document_id for group in groups for document_id in group["ids"][1:]]
+    if duplicates:
+        await collection.delete_many({"_id": {"$in": duplicates}})
+        logging.warning(f"{len(duplicates)} doublon(s) supprimé(s) dans {collection.name} ({', '.join(fields)}).")
+
+
+async def deduplicate_unique_keys(storage):
+    # Les upserts concurrents ont pu créer plusieurs documents par utilisateur : on garde le plus avancé
+    await remove_duplicates(storage["xp_data"], ["user_id"], {"xp": DESCENDING})
+    await remove_duplicates(storage["genance_data"], ["user_id"], {"genance_points": DESCENDING})
+    await remove_duplicates(storage["event_participants"], ["user_id", "event_name"], {"_id": ASCENDING})
+    await remove_duplicates(storage["ignored_channels"], ["channel_id"], {"_id": ASCENDING})
+    await remove_duplicates(storage["events"], ["name"], {"_id": ASCENDING})
+
+
+# Migrations versionnées : (version, description, coroutine recevant le Storage), appliquées dans l'ordre
+MIGRATIONS = [
+    (1, "Suppression des doublons avant la création des index uniques", deduplicate_unique_keys),
+]
+
+
+async def run_migrations(storage):
+    """Applique les migrations dont la version est supérieure à celle enregistrée en base."""
+    versions = storage["schema_version"]
+    document = await versions.find_one({"_id": SCHEMA_ID})
+    current = document["version"] if document else 0
+
+    for version, description, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        start = time.perf_counter()
+        logging.info(f"Migration {version} : {description}...")
+        await migration(storage)
+        # La version est enregistrée après chaque migration réussie, pour reprendre au bon endroit
+        await versions.update_one({"_id": SCHEMA_ID}, {"$set": {"version": version}}, upsert=True)
+        logging.info(f"Migration {version} appliquée en {time.perf_counter() - start:.2f}s.")
+        current = version
+
+
+async def ensure_indexes(storage):
+    """Crée les index manquants du registre ; les index déjà présents ne sont pas reconstruits."""
+    existing = {}
+    for index in INDEXES:
+        collection = storage[index.collection]
+        if index.collection not in existing:
+            information = await collection.index_information()
+            existing[index.collection] = {tuple(map(tuple, spec["key"])) for spec in information.values()}
+        if tuple(index.keys) in existing[index.collection]:
+            continue
+
+        start = time.perf_counter()
+        try:
+            name = await collection.create_index(index.keys, unique=index.unique, **index.options)
+        except OperationFailure as e:
+            logging.error(f"Erreur lors de la création de l'index {index.keys} sur {index.collection} : {e}")
+            continue
+        existing[index.collection].add(tuple(index.keys))
+        logging.info(f"Index {name} créé sur {index.collection} en {time.perf_counter() - start:.2f}s.")
+
+
+async def ensure_schema(storage):
+    """Met la base à jour au démarrage : migrations en attente, puis index du registre."""
+    start = time.perf_counter()
+    await run_migrations(storage)
+    await ensure_indexes(storage)
+    logging.info(f"Schéma MongoDB vérifié en {time.perf_counter() - start:.2f}s.")
@@ -1,10 +1,6 @@
 import os
 from dotenv import load_dotenv
-import discord
-import time
-import math
-from discord.ext import commands
-from keep_alive import keep_alive
+from bot import run_bot
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -13,20 +9,7 @@ logging.basicConfig(level=logging.INFO)
 load_dotenv()
 token = os.getenv('708_TOKEN')
 
-class MyBot(commands.Bot):
-    async def setup_hook(self):
-        for extension in ['random','ping','mimir','poke','sun','messages','bug_report','status','events','absences']:
-            await self.load_extension(f'cogs.{extension}')
-            logging.info(f'Loaded: cogs.{extension}')
-    async def on_ready(self):
-        await bot.tree.sync()
-        """await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.playing, name =f"{bot.command_prefix}help"))"""
-        logging.info(f'Lancé en tant que {self.user} !')
-        logging.info(f"discord.py version: {discord.__version__}")
-        
-
-intents = discord.Intents.all()
-bot = MyBot(command_prefix='.', intents=intents)
-
-keep_alive()
-bot.run(token=token)
\ No newline at end of file
+# Un seul processus. SHARD_COUNT fixe le nombre de shards (par défaut : celui recommandé par Discord) ;
+# pour répartir les shards sur plusieurs processus, utiliser cluster.py.
+shard_count = os.getenv("SHARD_COUNT")
+run_bot(token, shard_count=int(shard_count) if shard_count else None)
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne  # type: ignore
+from pymongo.errors import BulkWriteError  # type: ignore
+
+from ttl_store import TTLStore
+
+# Réglages du stockage partagé (STATE_BACKEND=mongo)
+SHARED_STATE = {
+    "collection": "shared_state",
+    "claim_window": 0.005,   # Secondes pendant lesquelles les réservations sont regroupées en une écriture
+    "flush_interval": 1,     # Secondes entre deux écritures groupées des valeurs
+}
+
+DUPLICATE_KEY = 11000
+
+
+def key_id(namespace, key):
+    """Identifiant de document d'une clé : "espace:clé" (les tuples sont joints par ":")."""
+    if isinstance(key, tuple):
+        key = ":".join(map(str, key))
+    return f"{namespace}:{key}"
+
+
+class MemoryNamespace:
+    """Espace de clés à expiration propre au processus : chaque accès est un simple accès mémoire."""
+
+    def __init__(self, name, ttl, max_size=None):
+        self.name = name
+        self.local = TTLStore(ttl, max_size=max_size)
+
+    async def claim(self, key, value=True):
+        """Réserve une clé si elle est libre (ou expirée) ; retourne False si elle est déjà prise."""
+        if key in self.local:
+            return False
+        self.local.set(key, value)
+        return True
+
+    async def get(self, key):
+        return self.local.get(key)
+
+    async def put(self, key, value):
+        self.local.set(key, value)
+
+    async def delete(self, key):
+        self.local.discard(key)
+
+    def stats(self):
+        return self.local.stats()
+
+
+class MemoryStateBackend:
+    """État anti-abus et sessions en mémoire : adapté à un bot en un seul processus."""
+
+    def __init__(self):
+        self.namespaces = {}
+
+    def namespace(self, name, ttl, max_size=None, early_release=False):
+        if name not in self.namespaces:
+            self.namespaces[name] = MemoryNamespace(name, ttl, max_size)
+        return self.namespaces[name]
+
+    async def start(self):
+        pass
+
+    async def flush(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class SharedNamespace(MemoryNamespace):
+    """Espace de clés partagé entre processus via une collection MongoDB à expiration (index TTL).
+
+    Les clés réservées par ce processus sont gardées dans le TTLStore local : elles sont refusées
+    sans accès réseau. Seule la première réservation d'une clé fait un aller-retour, regroupé avec
+    les autres réservations du moment ; les écritures de valeurs sont groupées en arrière-plan.
+    """
+
+    def __init__(self, backend, name, ttl, max_size=None, early_release=False):
+        super().__init__(name, ttl, max_size)
+        self.backend = backend
+        self.ttl = ttl
+        # Clés prises par un autre processus -> fin de leur réservation (time.monotonic) ; pas de cache
+        # des refus si les clés peuvent être libérées avant leur expiration (`early_release`)
+        self.refused = None if early_release else TTLStore(ttl, max_size=max_size)
+
+    def expires_at(self):
+        return datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+
+    async def claim(self, key, value=True):
+        if key in self.local:
+            return False
+        if self.refused is not None and self.refused.get(key, 0) > time.monotonic():
+            return False
+        claimed = await self.backend.claim(key_id(self.name, key), self.name, value, self.expires_at())
+        if claimed:
+            self.local.set(key, value)
+        elif self.refused is not None:
+            await self.remember_refusal(key)
+        return claimed
+
+    async def remember_refusal(self, key):
+        """Met en cache un refus jusqu'à l'expiration de la réservation du processus qui détient la clé."""
+        document = await self.backend.collection.find_one({"_id": key_id(self.name, key)}, {"expires_at": 1})
+        if document is None:
+            return  # Réservation expirée entre-temps : la prochaine tentative peut réussir
+        expires_at = document["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)  # pymongo renvoie des dates UTC naïves
+        remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        if remaining > 0:
+            self.refused.set(key, time.monotonic() + remaining)
+
+    async def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        document = await self.backend.collection.find_one(
+            {"_id": key_id(self.name, key), "expires_at": {"$gt": datetime.now(timezone.utc)}}
+        )
+        if document is None:
+            return None
+        self.local.set(key, document["value"])
+        return document["value"]
+
+    async def put(self, key, value):
+        self.local.set(key, value)
+        self.backend.queue(key_id(self.name, key), UpdateOne(
+            {"_id": key_id(self.name, key)},
+            {"$set": {"ns": self.name, "value": value, "expires_at": self.expires_at()}},
+            upsert=True,
+        ))
+
+    def stats(self):
+        stats = self.local.stats()
+        if self.refused is not None:
+            stats["refused"] = len(self.refused)
+        return stats
+
+    async def delete(self, key):
+        # Écriture immédiate : la clé doit être libre pour les autres processus sans attendre
+        self.local.discard(key)
+        self.backend.pending_writes.pop(key_id(self.name, key), None)
+        await self.backend.collection.delete_one({"_id": key_id(self.name, key)})
+
+
+class MongoStateBackend:
+    """État partagé entre les processus d'un cluster, stocké dans une collection MongoDB à index TTL."""
+
+    def __init__(self, storage):
+        self.collection = storage[SHARED_STATE["collection"]]
+        self.namespaces = {}
+        self.pending_writes = {}  # document -> dernière écriture en attente (les précédentes sont remplacées)
+        self.pending_claims = []  # (document, espace, valeur, expiration, future)
+        self.claim_task = None
+        self.flush_task = None
+
+    def namespace(self, name, ttl, max_size=None, early_release=False):
+        if name not in self.namespaces:
+            self.namespaces[name] = SharedNamespace(self, name, ttl, max_size, early_release)
+        return self.namespaces[name]
+
+    async def start(self):
+        self.flush_task = asyncio.create_task(self.flush_periodically())
+
+    def queue(self, document_id, operation):
+        self.pending_writes[document_id] = operation
+
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(SHARED_STATE["flush_interval"])
+            await self.flush()
+
+    async def flush(self):
+        """Écrit en une seule requête les valeurs modifiées depuis la dernière écriture."""
+        if not self.pending_writes:
+            return
+        operations, self.pending_writes = list(self.pending_writes.values()), {}
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logging.error(f"Erreur lors de l'écriture de l'état partagé ({len(operations)} opération(s)) : {e}")
+
+    async def claim(self, document_id, namespace, value, expires_at):
+        """Réserve une clé ; les réservations arrivant dans la même fenêtre partagent une écriture."""
+        future = asyncio.get_running_loop().create_future()
+        self.pending_claims.append((document_id, namespace, value, expires_at, future))
+        if self.claim_task is None:
+            self.claim_task = asyncio.create_task(self.flush_claims())
+        return await future
+
+    async def flush_claims(self):
+        await asyncio.sleep(SHARED_STATE["claim_window"])
+        claims, self.pending_claims, self.claim_task = self.pending_claims, [], None
+        now = datetime.now(timezone.utc)
+        # Le filtre ne correspond qu'à une clé expirée : une clé encore valide provoque un doublon d'_id
+        operations = [
+            UpdateOne(
+                {"_id": document_id, "expires_at": {"$lte": now}},
+                {"$set": {"ns": namespace, "value": value, "expires_at": expires_at}},
+                upsert=True,
+            )
+            for document_id, namespace, value, expires_at, _ in claims
+        ]
+        refused = set()
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            refused = {error["index"] for error in errors if error.get("code") == DUPLICATE_KEY}
+            if len(refused) < len(errors):
+                logging.error(f"Erreur lors de la réservation de clés partagées : {errors}")
+        except Exception as e:
+            # MongoDB indisponible : la décision locale s'applique plutôt que de bloquer les gains
+            logging.error(f"Erreur lors de la réservation de clés partagées : {e}")
+        for index, (*_, future) in enumerate(claims):
+            if not future.done():
+                future.set_result(index not in refused)
+
+    async def close(self):
+        if self.flush_task:
+            self.flush_task.cancel()
+        await self.flush()
+
+
+def create_state_backend(storage):
+    """STATE_BACKEND : "memory" (défaut, un seul processus) ou "mongo" (partagé entre processus)."""
+    backend = os.getenv("STATE_BACKEND", "memory")
+    if backend == "mongo":
+        logging.info("État anti-abus partagé via MongoDB.")
+        return MongoStateBackend(storage)
+    if backend != "memory":
+        logging.warning(f"STATE_BACKEND inconnu ({backend}), état en mémoire utilisé.")
+    return MemoryStateBackend()
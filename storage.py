@@ -0,0 +1,139 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import MongoClient  # type: ignore
+
+from metrics import MONGO_ERRORS, MONGO_LATENCY
+
+# Nombre maximum d'opérations MongoDB exécutées en parallèle hors de la boucle d'événements
+DEFAULT_MAX_WORKERS = 8
+
+# Réglages du client MongoDB partagé : variable d'environnement -> (option pymongo, valeur par défaut)
+MONGO_OPTIONS = {
+    "MONGO_MAX_POOL_SIZE": ("maxPoolSize", 20),
+    "MONGO_MIN_POOL_SIZE": ("minPoolSize", 0),
+    "MONGO_MAX_IDLE_TIME_MS": ("maxIdleTimeMS", 300000),
+    "MONGO_CONNECT_TIMEOUT_MS": ("connectTimeoutMS", 10000),
+    "MONGO_SOCKET_TIMEOUT_MS": ("socketTimeoutMS", 30000),
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": ("serverSelectionTimeoutMS", 10000),
+    "MONGO_WRITE_CONCERN": ("w", 1),
+}
+
+
+class AsyncCollection:
+    """Enveloppe asynchrone d'une collection pymongo : chaque appel s'exécute dans l'exécuteur du Storage."""
+
+    def __init__(self, storage, collection):
+        self.storage = storage
+        self.collection = collection
+        self.name = collection.name
+
+    async def find_one(self, *args, **kwargs):
+        return await self.storage.run(self.collection.find_one, *args, **kwargs)
+
+    async def find(self, *args, **kwargs):
+        """Exécute la requête et retourne tous les documents sous forme de liste."""
+        def find():
+            return list(self.collection.find(*args, **kwargs))
+        return await self.storage.run(find)
+
+    async def insert_one(self, *args, **kwargs):
+        return await self.storage.run(self.collection.insert_one, *args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        return await self.storage.run(self.collection.update_one, *args, **kwargs)
+
+    async def delete_one(self, *args, **kwargs):
+        return await self.storage.run(self.collection.delete_one, *args, **kwargs)
+
+    async def delete_many(self, *args, **kwargs):
+        return await self.storage.run(self.collection.delete_many, *args, **kwargs)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        return await self.storage.run(self.collection.find_one_and_update, *args, **kwargs)
+
+    async def bulk_write(self, *args, **kwargs):
+        return await self.storage.run(self.collection.bulk_write, *args, **kwargs)
+
+    async def count_documents(self, *args, **kwargs):
+        return await self.storage.run(self.collection.count_documents, *args, **kwargs)
+
+    async def estimated_document_count(self, *args, **kwargs):
+        return await self.storage.run(self.collection.estimated_document_count, *args, **kwargs)
+
+    async def aggregate(self, *args, **kwargs):
+        """Exécute le pipeline et retourne tous les résultats sous forme de liste."""
+        def aggregate():
+            return list(self.collection.aggregate(*args, **kwargs))
+        return await self.storage.run(aggregate)
+
+    async def create_index(self, *args, **kwargs):
+        return await self.storage.run(self.collection.create_index, *args, **kwargs)
+
+    async def index_information(self):
+        return await self.storage.run(self.collection.index_information)
+
+
+class Storage:
+    """Accès MongoDB non bloquant : les appels pymongo sont déportés dans un pool de threads borné."""
+
+    def __init__(self, mongo_uri, db_name="discord_bot", max_workers=DEFAULT_MAX_WORKERS, **client_options):
+        self.client = MongoClient(mongo_uri, **client_options)
+        self.db = self.client[db_name]
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mongo")
+        self.collections = {}
+
+    @classmethod
+    def from_env(cls):
+        """Crée le Storage partagé du bot à partir des variables d'environnement."""
+        mongo_uri = os.getenv("MONGO_URI")
+        if not mongo_uri:
+            logging.error("Erreur : URI MongoDB non configurée dans les variables d'environnement.")
+            raise ValueError("La variable d'environnement MONGO_URI est obligatoire.")
+
+        options = {}
+        for variable, (option, default) in MONGO_OPTIONS.items():
+            value = os.getenv(variable)
+            if value is None:
+                options[option] = default
+            elif option == "w" and not value.isdigit():
+                options[option] = value  # Write concern nommé, par exemple "majority"
+            else:
+                options[option] = int(value)
+
+        max_workers = int(os.getenv("MONGO_EXECUTOR_WORKERS", DEFAULT_MAX_WORKERS))
+        # Pas plus de threads que de connexions disponibles : les threads en trop attendraient le pool
+        max_workers = min(max_workers, options["maxPoolSize"]) if options["maxPoolSize"] else max_workers
+        return cls(
+            mongo_uri,
+            db_name=os.getenv("MONGO_DB_NAME", "discord_bot"),
+            max_workers=max_workers,
+            **options,
+        )
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = AsyncCollection(self, self.db[name])
+        return self.collections[name]
+
+    async def run(self, func, *args, **kwargs):
+        """Exécute une fonction bloquante dans l'exécuteur MongoDB et attend son résultat (durée mesurée par opération)."""
+        loop = asyncio.get_running_loop()
+        operation = getattr(func, "__name__", "run")
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+        except Exception:
+            MONGO_ERRORS.inc(operation)
+            raise
+        finally:
+            MONGO_LATENCY.observe(time.perf_counter() - started, operation)
+
+    def close(self):
+        """Ferme le client MongoDB et libère les threads de l'exécuteur."""
+        self.executor.shutdown(wait=False)
+        self.client.close()
@@ -0,0 +1,64 @@
+import sys
+import time
+from collections import OrderedDict
+
+
+class TTLStore:
+    """Dictionnaire à expiration : chaque clé expire `ttl` secondes après sa dernière écriture.
+
+    La durée de vie étant la même pour toutes les clés, l'ordre d'insertion est aussi l'ordre
+    d'expiration : l'éviction se fait par le début du dictionnaire, en O(1) amorti.
+    """
+
+    def __init__(self, ttl, max_size=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()  # clé -> (expiration, valeur)
+        self.evictions = 0
+
+    def evict(self, now=None):
+        """Supprime les clés expirées."""
+        now = time.monotonic() if now is None else now
+        while self.entries:
+            key, (expires, _) = next(iter(self.entries.items()))
+            if expires > now:
+                break
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key, value=True):
+        now = time.monotonic()
+        self.evict(now)
+        # Une clé réécrite repasse en fin de file avec une nouvelle expiration
+        self.entries.pop(key, None)
+        self.entries[key] = (now + self.ttl, value)
+        if self.max_size is not None and len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+
+    def get(self, key, default=None):
+        self.evict()
+        entry = self.entries.get(key)
+        return entry[1] if entry else default
+
+    def __contains__(self, key):
+        self.evict()
+        return key in self.entries
+
+    def __len__(self):
+        self.evict()
+        return len(self.entries)
+
+    def stats(self):
+        """Taille, évictions et mémoire approximative (dictionnaire et tuples d'entrées) du store."""
+        size = len(self)
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "evictions": self.evictions,
+            "bytes": sys.getsizeof(self.entries) + size * sys.getsizeof((0.0, None)),
+        }
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import math
+import os
+
+from aiohttp import web
+
+from metrics import CACHE_SIZE, GATEWAY_LATENCY, REGISTRY
+
+# Délai maximal du ping MongoDB de la sonde de disponibilité
+MONGO_PING_TIMEOUT = 2
+
+
+class WebServer:
+    """Serveur HTTP sur la boucle d'événements du bot : /health, /ready et /metrics (format Prometheus)."""
+
+    def __init__(self, bot, host, port):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.runner = None
+
+        self.app = web.Application()
+        self.app.router.add_get("/", self.home)
+        self.app.router.add_get("/health", self.health)
+        self.app.router.add_get("/ready", self.ready)
+        self.app.router.add_get("/metrics", self.metrics)
+
+        GATEWAY_LATENCY.collect = self.gateway_latencies
+        CACHE_SIZE.collect = self.cache_sizes
+
+    @classmethod
+    def from_env(cls, bot):
+        """HTTP_HOST et HTTP_PORT ; dans un cluster, chaque processus écoute sur HTTP_PORT + son numéro."""
+        port = int(os.getenv("HTTP_PORT", 8080)) + getattr(bot, "cluster_id", 0)
+        return cls(bot, os.getenv("HTTP_HOST", "0.0.0.0"), port)
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logging.info(f"Serveur HTTP démarré sur {self.host}:{self.port}.")
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def home(self, request):
+        return web.Response(text="Le bot est en ligne")
+
+    async def health(self, request):
+        """Vivacité : la boucle d'événements répond."""
+        return web.Response(text="ok")
+
+    async def mongo_reachable(self):
+        storage = getattr(self.bot, "storage", None)
+        if storage is None:
+            return False
+        try:
+            await asyncio.wait_for(storage.run(storage.client.admin.command, "ping"), MONGO_PING_TIMEOUT)
+            return True
+        except Exception as e:
+            logging.warning(f"MongoDB injoignable pour la sonde de disponibilité : {e}")
+            return False
+
+    async def ready(self, request):
+        """Disponibilité : passerelle connectée (au moins un shard ouvert) et MongoDB joignable."""
+        gateway = self.bot.is_ready() and any(not shard.is_closed() for shard in self.bot.shards.values())
+        mongo = await self.mongo_reachable()
+        status = 200 if gateway and mongo else 503
+        return web.json_response({"gateway": gateway, "mongo": mongo}, status=status)
+
+    async def metrics(self, request):
+        return web.Response(
+            text=REGISTRY.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+    def gateway_latencies(self):
+        for shard_id, latency in self.bot.latencies:
+            if math.isfinite(latency):
+                yield (shard_id,), latency
+
+    def cache_sizes(self):
+        bot = self.bot
+        yield ("guilds",), len(bot.guilds)
+        yield ("users",), len(bot.users)
+        yield ("members",), sum(len(guild.members) for guild in bot.guilds)
+        yield ("messages",), len(bot.cached_messages)
+        # Caches du système d'XP (stores à expiration, tampon d'écriture, sessions vocales)
+        xp_cog = bot.get_cog("XPSystem")
+        if xp_cog is not None:
+            for name, stats in xp_cog.cache_stats().items():
+                yield (f"xp.{name}",), stats["size"]